@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,11 +45,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.middleware.MetricsMiddleware',
+    'LittleLemonAPI.middleware.CompressionMiddleware',
+    'LittleLemonAPI.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'LittleLemonAPI.middleware.ThrottleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,13 +82,78 @@ WSGI_APPLICATION = 'LittleLemon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# The primary database is configured from the DATABASE_* environment variables and falls back
+# to SQLite at BASE_DIR / 'db.sqlite3'. DATABASE_REPLICAS is a comma separated list of replica
+# hosts (file names for SQLite), read-only views are routed to them by PrimaryReplicaRouter.
+
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'django.db.backends.sqlite3')
+
+if DATABASE_ENGINE == 'django.db.backends.sqlite3':
+    PRIMARY_DATABASE = {
+        'ENGINE': DATABASE_ENGINE,
+        'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+    }
+else:
+    PRIMARY_DATABASE = {
+        'ENGINE': DATABASE_ENGINE,
+        'NAME': os.environ.get('DATABASE_NAME', 'littlelemon'),
+        'USER': os.environ.get('DATABASE_USER', ''),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+        'HOST': os.environ.get('DATABASE_HOST', ''),
+        'PORT': os.environ.get('DATABASE_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
+    if os.environ.get('DATABASE_POOL_MAX_SIZE'):
+        # Pooled connections (psycopg 3, PostgreSQL only) replace persistent ones.
+        PRIMARY_DATABASE['CONN_MAX_AGE'] = 0
+        PRIMARY_DATABASE['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ['DATABASE_POOL_MAX_SIZE']),
+            },
+        }
+
+DATABASES = {
+    'default': PRIMARY_DATABASE,
 }
 
+for number, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica_{number}'] = {
+        **PRIMARY_DATABASE,
+        'NAME' if DATABASE_ENGINE == 'django.db.backends.sqlite3' else 'HOST': replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['LittleLemonAPI.routers.PrimaryReplicaRouter']
+
+# Seconds a user keeps reading from the primary after a write, to cover replication lag.
+DATABASE_REPLICATION_LAG = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Roles, tokens, the catalogue version, idempotency keys and throttle counters are kept in the default
+# cache and must be seen by every worker process. CACHE_LOCATION is the URL of the Redis server they share,
+# without it each process gets a private local memory cache, which only suits a single process.
+
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_LOCATION,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -131,14 +201,53 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
-        'rest_framework_xml.renderers.XMLRenderer',
+        'LittleLemonAPI.renderers.FastXMLRenderer',
     ] ,
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonAPI.authentication.CachingTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ]
 }
 
 DJOSER = {
     'USER_ID_FIELD': 'username'
-}
\ No newline at end of file
+}
+
+# Seconds the application server lets a request run before killing its worker (gunicorn --timeout, uwsgi harakiri).
+# Idempotency keys stay locked this long while their first request runs, keep it in line with the server.
+REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', 60))
+
+# Requests slower than this many seconds are logged with their SQL, None disables the log.
+METRICS_SLOW_REQUEST_SECONDS = None
+
+# Responses smaller than this many bytes are sent uncompressed, see LittleLemonAPI.middleware.CompressionMiddleware.
+COMPRESSION_MIN_SIZE = 1024
+
+# Requests per role ('anon', 'customer', 'Delivery crew' or 'Manager') on every endpoint ('*') or on one URL name
+# of LittleLemonAPI/urls.py, see LittleLemonAPI.throttling. Roles without a rate are not throttled.
+THROTTLE_RATES = {
+    '*': {'anon': '20/min', 'customer': '120/min', 'Delivery crew': '240/min', 'Manager': '600/min'},
+    'orders-management-view': {'customer': '30/min'},
+    'cart-management-view': {'customer': '60/min'},
+    'delivery-queue-view': {'Delivery crew': '60/min'},
+    'orders-export-view': {'Manager': '10/min'},
+    'menu-import-view': {'Manager': '10/min'},
+}
+
+# Counter store of the throttles, CacheThrottleStore shares the counters through the default cache
+# when CACHE_LOCATION points it to a shared server.
+THROTTLE_STORE = 'LittleLemonAPI.throttling.CacheThrottleStore'
+
+# Number of reverse proxies in front of the application. Anonymous clients are throttled by the address
+# these proxies add to X-Forwarded-For, or by REMOTE_ADDR when there are none.
+THROTTLE_NUM_PROXIES = int(os.environ.get('THROTTLE_NUM_PROXIES', 0))
+
+# Delivered orders older than this many days are moved to the archive tables by the archive_orders command.
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
+# On PostgreSQL, create the order archive partitioned by year of the order date. Read by the migration
+# that creates the archive, set it before migrating.
+ORDER_ARCHIVE_PARTITIONED = os.environ.get('ORDER_ARCHIVE_PARTITIONED') == '1'
+
+# Pub/sub broker behind the order events stream, see LittleLemonAPI.events.InMemoryBroker.
+ORDER_EVENTS_BROKER = 'LittleLemonAPI.events.InMemoryBroker'
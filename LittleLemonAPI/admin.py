@@ -1,8 +1,12 @@
 from django.contrib import admin
-from .models import Category,MenuItem,Cart,Order,OrderItem
+from .models import Category,MenuItem,Cart,CartSummary,Order,OrderItem,DailySales,ArchivedOrder,ArchivedOrderItem
 # Register your models here.
 admin.site.register(Category)
 admin.site.register(MenuItem)
 admin.site.register(Cart)
+admin.site.register(CartSummary)
 admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(DailySales)
+admin.site.register(ArchivedOrder)
+admin.site.register(ArchivedOrderItem)
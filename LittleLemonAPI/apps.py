@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class LittlelemondrfConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LittleLemonAPI'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.core import checks
+        from django.db.models.signals import post_delete, post_save, pre_delete
+        from rest_framework.authtoken.models import Token
+        from .authentication import token_deleted, user_saved
+        from .caching import check_shared_cache
+        from .models import Order
+        from .sales import remove_order_sales
+
+        pre_delete.connect(remove_order_sales, sender=Order, dispatch_uid='remove_order_sales')
+        post_delete.connect(token_deleted, sender=Token, dispatch_uid='token_deleted')
+        post_save.connect(user_saved, sender=User, dispatch_uid='user_saved')
+        checks.register(check_shared_cache, checks.Tags.caches, deploy=True)
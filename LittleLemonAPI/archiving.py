@@ -0,0 +1,88 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .sales import keeping_sales
+
+ARCHIVE_BATCH_SIZE = 1000
+
+ORDER_COLUMNS = ('id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date')
+ORDER_ITEM_COLUMNS = ('id', 'order_id', 'menuitem_id', 'quantity', 'unit_price', 'price')
+
+
+def archive_horizon(days=None):
+    """
+        Returns the first date that is not archived, settings.ORDER_ARCHIVE_AFTER_DAYS days back by default.
+    """
+    if days is None:
+        days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    return timezone.localdate() - datetime.timedelta(days=days)
+
+
+def archivable_orders(before):
+    """
+        Returns the delivered orders dated before the horizon, oldest first, selected by the index of Order.date.
+
+        * Undelivered orders stay in the hot table, the delivery queue and the delivery crew still act on them.
+    """
+    return Order.objects.filter(date__lt=before, status=True).order_by('date', 'id')
+
+
+def ensure_partitions(dates):
+    """
+        Creates the yearly partitions of the order archive the dates fall in, when it is partitioned.
+    """
+    if connection.vendor != 'postgresql' or not getattr(settings, 'ORDER_ARCHIVE_PARTITIONED', False):
+        return
+
+    table = ArchivedOrder._meta.db_table
+    with connection.cursor() as cursor:
+        for year in sorted({date.year for date in dates}):
+            partition = connection.ops.quote_name(f'{table}_{year}')
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {connection.ops.quote_name(table)} '
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+
+
+def archive_batch(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+        Moves up to batch_size orders dated before the horizon with their items to the archive, returns the number moved.
+
+        * One transaction per batch, the rows are copied with bulk_create and deleted by id.
+        * Orders locked by another transaction are skipped and archived by a later run.
+        * The daily sales rollups keep the archived orders.
+    """
+    with transaction.atomic():
+        orders = list(
+            archivable_orders(before).select_for_update(skip_locked=True).values_list(*ORDER_COLUMNS)[:batch_size])
+        if not orders:
+            return 0
+
+        ids = [order[0] for order in orders]
+        items = OrderItem.objects.filter(order_id__in=ids).values_list(*ORDER_ITEM_COLUMNS)
+
+        ensure_partitions(order[-1] for order in orders)
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**dict(zip(ORDER_COLUMNS, order))) for order in orders])
+        ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(**dict(zip(ORDER_ITEM_COLUMNS, item))) for item in items])
+
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        with keeping_sales():
+            Order.objects.filter(pk__in=ids).delete()
+
+    return len(orders)
+
+
+def archive_orders(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+        Archives every delivered order dated before the horizon in batches of batch_size, returns the number moved.
+    """
+    archived = 0
+    while moved := archive_batch(before, batch_size):
+        archived += moved
+        if moved < batch_size:
+            break
+    return archived
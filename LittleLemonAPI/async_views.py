@@ -0,0 +1,117 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+from . import views
+from .authentication import aauthenticate_token
+from .catalogue import acatalogue_response
+from .delivery import aclaim_order, long_poll_wait
+from .events import get_broker, order_channels, order_event_stream
+from .fast_serializers import dumps
+from .models import MenuItem
+from .orders import aorder_feed_data
+from .renderers import STREAM_MIN_ROWS, aiterate, stream_json
+from .roles import DELIVERY_CREW, aget_roles
+from .routers import areplica_reads
+from .serializers import MenuItemSerializer, OrderFeedSerializer, DeliveryQueueSerializer
+
+# Native async implementations of the read-heavy GET endpoints. A request they cannot answer
+# on their own (writes, other renderers, session users, errors) is handed to the DRF view.
+
+
+def _accepts_json(request):
+    if request.GET.get(api_settings.URL_FORMAT_OVERRIDE, 'json') != 'json':
+        return False
+
+    preferred = request.headers.get('Accept', '*/*').split(',')[0].split(';')[0].strip()
+    return preferred in ('', '*/*', 'application/*', 'application/json')
+
+
+async def _json_get_user(request, method='GET'):
+    if request.method != method or not _accepts_json(request):
+        return None
+    return await aauthenticate_token(request)
+
+
+def _json_response(data, status=200):
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+
+def _json_list_response(rows):
+    if len(rows) >= STREAM_MIN_ROWS:
+        # An async iterator, the ASGI handler would otherwise move every chunk to a thread.
+        return StreamingHttpResponse(aiterate(stream_json(rows)), content_type='application/json')
+    return _json_response(rows)
+
+
+@csrf_exempt
+async def menu_items(request):
+    user = await _json_get_user(request)
+    if user is not None:
+        try:
+            async with areplica_reads(user):
+                return await acatalogue_response(request)
+        except APIException:
+            pass
+
+    return await sync_to_async(views.menu_items)(request)
+
+
+@csrf_exempt
+async def menu_item(request, menuItem):
+    user = await _json_get_user(request)
+    if user is not None:
+        try:
+            async with areplica_reads(user):
+                item = await MenuItem.objects.aget(pk=menuItem)
+        except MenuItem.DoesNotExist:
+            pass
+        else:
+            return _json_response(MenuItemSerializer(item, many=False).data)
+
+    return await sync_to_async(views.menu_item)(request, menuItem)
+
+
+@csrf_exempt
+async def orders_management_view(request):
+    user = await _json_get_user(request)
+    if user is not None:
+        await aget_roles(user)
+        async with areplica_reads(user):
+            orders = await aorder_feed_data(user)
+        return _json_list_response(orders)
+
+    return await sync_to_async(views.orders_management_view)(request)
+
+
+@csrf_exempt
+async def delivery_queue_view(request):
+    user = await _json_get_user(request, method='POST')
+    if user is not None and DELIVERY_CREW in await aget_roles(user):
+        params = DeliveryQueueSerializer(data=request.GET.dict())
+        if params.is_valid():
+            order = await aclaim_order(user, long_poll_wait(request, params.validated_data['wait']))
+            if order is None:
+                return HttpResponse(status=204)
+            return _json_response(await sync_to_async(lambda: OrderFeedSerializer(order).data)())
+
+    return await sync_to_async(views.delivery_queue_view)(request)
+
+
+async def order_events_view(request):
+    """
+        Server-Sent Events stream of the status and delivery crew changes of the orders of the current user,
+        managers receive the changes of every order. Needs the ASGI application.
+    """
+    user = await aauthenticate_token(request) or await request.auser()
+    if not user.is_authenticated:
+        return _json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    subscription = get_broker().subscribe(order_channels(user, await aget_roles(user)))
+    return StreamingHttpResponse(
+        order_event_stream(subscription),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,222 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+
+from .caching import is_shared_cache
+
+TOKEN_CACHE_SIZE = 10000
+# Other processes only learn about a logout or a deactivation when their own entry expires.
+TOKEN_CACHE_LOCAL_TIMEOUT = 30
+TOKEN_CACHE_TIMEOUT = 60 * 5
+
+
+class TokenCache:
+    """
+        Bounded in-process LRU of token key -> (user, token) entries that expire after timeout seconds.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def discard_user(self, user_id):
+        with self.lock:
+            for key in [key for key, (_, (user, _)) in self.entries.items() if user.pk == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_LOCAL_TIMEOUT)
+
+
+def _shared_cache_key(key):
+    # Token keys are credentials, keep them out of the shared cache.
+    return f'auth-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def _detached(user, token):
+    """
+        Returns copies of the user and the token, so attributes set during one request never reach another.
+    """
+    user = copy.copy(user)
+    token = copy.copy(token)
+    token.user = user
+    return user, token
+
+
+def _remember(token):
+    user, token = _detached(token.user, token)
+    # Keep the password hash out of the caches, it is deferred and loaded again if a request reads it.
+    # save() on a user with deferred fields only writes the loaded ones, so the hash is never overwritten.
+    user.__dict__.pop('password', None)
+    entry = (user, token)
+    local_tokens.set(token.key, entry)
+    return entry
+
+
+def cache_token(token):
+    entry = _remember(token)
+    if is_shared_cache():
+        cache.set(_shared_cache_key(token.key), entry, TOKEN_CACHE_TIMEOUT)
+
+
+async def acache_token(token):
+    entry = _remember(token)
+    if is_shared_cache():
+        await cache.aset(_shared_cache_key(token.key), entry, TOKEN_CACHE_TIMEOUT)
+
+
+def get_cached_token(key):
+    """
+        Returns copies of the cached (user, token) pair of the token key, None when it is not cached.
+
+        * The in-process LRU is checked first, then the default cache when it is shared. A private
+          cache would only keep the token of another process past its logout for TOKEN_CACHE_TIMEOUT.
+    """
+    entry = local_tokens.get(key)
+    if entry is None:
+        if not is_shared_cache():
+            return None
+        entry = cache.get(_shared_cache_key(key))
+        if entry is None:
+            return None
+        local_tokens.set(key, entry)
+    return _detached(*entry)
+
+
+async def aget_cached_token(key):
+    entry = local_tokens.get(key)
+    if entry is None:
+        if not is_shared_cache():
+            return None
+        entry = await cache.aget(_shared_cache_key(key))
+        if entry is None:
+            return None
+        local_tokens.set(key, entry)
+    return _detached(*entry)
+
+
+def invalidate_tokens(*keys):
+    for key in keys:
+        local_tokens.discard(key)
+    cache.delete_many([_shared_cache_key(key) for key in keys])
+
+
+def token_deleted(sender, instance, **kwargs):
+    """
+        post_delete receiver of Token, covers the djoser logout and the deletion of users.
+    """
+    invalidate_tokens(instance.key)
+
+
+def user_saved(sender, instance, created=False, **kwargs):
+    """
+        post_save receiver of User, a deactivated or changed user is loaded again on the next request.
+    """
+    if created:
+        return
+
+    local_tokens.discard_user(instance.pk)
+    invalidate_tokens(*Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """
+        TokenAuthentication that keeps the user of each token in an in-process LRU backed by the shared cache.
+
+        * A cached token costs no query. The roles of the user are cached separately by get_roles.
+        * Entries are dropped when the token is deleted and when the user is saved, for example deactivated.
+          Queryset update() and delete() of users or tokens send no signal, their changes reach the
+          other processes when the entries expire, after TOKEN_CACHE_TIMEOUT seconds at most.
+        * The cached users hold no password hash.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = get_cached_token(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        cache_token(token)
+        return user, token
+
+
+def authenticate_token(request):
+    """
+        Returns the active user of the 'Authorization: Token <key>' header of a plain Django request,
+        None when there is none. Shares the token cache of CachingTokenAuthentication.
+    """
+    try:
+        result = CachingTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+async def aauthenticate_token(request):
+    """
+        Returns the active user of the 'Authorization: Token <key>' header of a plain Django request.
+
+        * Returns None when the header is missing or the token is unknown, so the caller
+          can hand the request to the DRF view for the regular authentication errors.
+        * Shares the token cache of CachingTokenAuthentication.
+    """
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return None
+
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return None
+
+    cached = await aget_cached_token(key)
+    if cached is not None:
+        return cached[0]
+
+    try:
+        token = await Token.objects.select_related('user').aget(key=key)
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+
+    await acache_token(token)
+    return token.user
@@ -0,0 +1,382 @@
+import asyncio
+import datetime
+import json
+import logging
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db.models import Prefetch
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework_xml.renderers import XMLRenderer
+
+from .cart import summarize_carts
+from .catalogue import menu_item_rows
+from .fast_serializers import dumps
+from .middleware import QueryRecorder, brotli, compress_chunks, record_queries
+from .models import Category, MenuItem, Cart, Order, OrderItem
+from .orders import order_feed, order_feed_data
+from .renderers import FastXMLRenderer, stream_json
+from .roles import MANAGER, DELIVERY_CREW
+from .serializers import MenuItemSerializer, OrderFeedSerializer
+
+# Highest number of SQL queries a single request to an endpoint may run.
+QUERY_BUDGETS = {
+    'menu-items': 2,
+    'menu-item': 2,
+    'cart-management-view': 12,
+    'cart-summary-view': 2,
+    'orders-management-view': 13,
+    'order-view': 4,
+    'delivery-queue-view': 7,
+}
+
+
+@dataclass
+class Dataset:
+    customers: list
+    delivery_crew: list
+    managers: list
+    tokens: dict
+    menu_item_ids: list
+    order_ids: list
+
+
+@dataclass
+class EndpointStats:
+    durations: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+
+    def percentile(self, percent):
+        if len(self.durations) < 2:
+            return self.durations[0] if self.durations else 0
+        return statistics.quantiles(self.durations, n=100, method='inclusive')[percent - 1]
+
+
+def seed_dataset(users=2000, menu_items=500, orders=5000, seed=0):
+    """
+        Bulk inserts a synthetic dataset and returns the ids the scenarios draw from.
+
+        * About 5% of the users are managers and 10% are delivery crew, every user gets a token.
+        * Every order and every customer cart holds one to five distinct menu items.
+    """
+    rng = random.Random(seed)
+    prefix = f'bench-{time.time_ns()}'
+
+    managers_group, _ = Group.objects.get_or_create(name=MANAGER)
+    delivery_crew_group, _ = Group.objects.get_or_create(name=DELIVERY_CREW)
+
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(username=f'{prefix}-{number}', password=password) for number in range(users)
+    ])
+    user_ids = list(User.objects.filter(username__startswith=f'{prefix}-').order_by('id').values_list('id', flat=True))
+
+    managers = user_ids[:max(1, users // 20)]
+    delivery_crew = user_ids[len(managers):len(managers) + max(1, users // 10)]
+    customers = user_ids[len(managers) + len(delivery_crew):]
+
+    memberships = User.groups.through
+    memberships.objects.bulk_create(
+        [memberships(user_id=user_id, group=managers_group) for user_id in managers]
+        + [memberships(user_id=user_id, group=delivery_crew_group) for user_id in delivery_crew]
+    )
+
+    tokens = {user_id: Token.generate_key() for user_id in user_ids}
+    Token.objects.bulk_create([Token(key=key, user_id=user_id) for user_id, key in tokens.items()])
+
+    Category.objects.bulk_create([
+        Category(slug=f'{prefix}-{number}', title=f'Category {number}') for number in range(10)
+    ])
+    category_ids = list(Category.objects.filter(slug__startswith=f'{prefix}-').values_list('id', flat=True))
+    MenuItem.objects.bulk_create([
+        MenuItem(
+            title=f'Dish {number}',
+            price=rng.randint(300, 3000) / 100,
+            featured=rng.random() < 0.1,
+            category_id=rng.choice(category_ids),
+        )
+        for number in range(menu_items)
+    ])
+    prices = dict(MenuItem.objects.filter(category_id__in=category_ids).values_list('id', 'price'))
+    menu_item_ids = sorted(prices)
+
+    today = datetime.date.today()
+    lines = []
+    new_orders = []
+    for _ in range(orders):
+        picked = [(menuitem_id, rng.randint(1, 3)) for menuitem_id in rng.sample(menu_item_ids, rng.randint(1, 5))]
+        lines.append(picked)
+        new_orders.append(Order(
+            user_id=rng.choice(customers),
+            delivery_crew_id=rng.choice(delivery_crew) if rng.random() < 0.7 else None,
+            status=rng.random() < 0.5,
+            total=sum(prices[menuitem_id] * quantity for menuitem_id, quantity in picked),
+            date=today - datetime.timedelta(days=rng.randint(0, 365)),
+        ))
+    Order.objects.bulk_create(new_orders, batch_size=1000)
+    order_ids = list(Order.objects.filter(user_id__in=customers).order_by('id').values_list('id', flat=True))
+
+    OrderItem.objects.bulk_create([
+        OrderItem(order_id=order_id, menuitem_id=menuitem_id, quantity=quantity,
+                  unit_price=prices[menuitem_id], price=prices[menuitem_id] * quantity)
+        for order_id, picked in zip(order_ids, lines)
+        for menuitem_id, quantity in picked
+    ], batch_size=1000)
+
+    Cart.objects.bulk_create([
+        Cart(user_id=user_id, menuitem_id=menuitem_id, quantity=1,
+             unit_price=prices[menuitem_id], price=prices[menuitem_id])
+        for user_id in customers
+        for menuitem_id in rng.sample(menu_item_ids, rng.randint(1, 5))
+    ], batch_size=1000)
+    summarize_carts(customers)
+
+    return Dataset(customers, delivery_crew, managers, tokens, menu_item_ids, order_ids)
+
+
+def scenarios(dataset):
+    """
+        Returns the weighted request mix as (weight, url name, role, users, request builder) tuples.
+
+        * Customers browse the menu, fill their cart and check out, delivery crew claim orders and
+          delivery crew and managers read the orders they are responsible for.
+    """
+    def menu_items(rng):
+        return 'get', reverse('menu-items'), {}
+
+    def menu_item(rng):
+        return 'get', reverse('menu-item', args=[rng.choice(dataset.menu_item_ids)]), {}
+
+    def cart_read(rng):
+        return 'get', reverse('cart-management-view'), {}
+
+    def cart_write(rng):
+        items = [{'menuitem': menuitem_id, 'quantity': rng.randint(1, 3)}
+                 for menuitem_id in rng.sample(dataset.menu_item_ids, rng.randint(1, 5))]
+        return 'post', reverse('cart-management-view'), {'data': items, 'content_type': 'application/json'}
+
+    def cart_summary(rng):
+        return 'get', reverse('cart-summary-view'), {}
+
+    def orders(rng):
+        return 'get', reverse('orders-management-view'), {}
+
+    def checkout(rng):
+        return 'post', reverse('orders-management-view'), {}
+
+    def order(rng):
+        return 'get', reverse('order-view', args=[rng.choice(dataset.order_ids)]), {}
+
+    def claim(rng):
+        return 'post', reverse('delivery-queue-view'), {}
+
+    return [
+        (30, 'menu-items', 'customer', dataset.customers, menu_items),
+        (10, 'menu-item', 'customer', dataset.customers, menu_item),
+        (10, 'cart-management-view', 'customer', dataset.customers, cart_read),
+        (10, 'cart-management-view', 'customer', dataset.customers, cart_write),
+        (10, 'cart-summary-view', 'customer', dataset.customers, cart_summary),
+        (10, 'orders-management-view', 'customer', dataset.customers, orders),
+        (5, 'orders-management-view', 'customer', dataset.customers, checkout),
+        (5, 'menu-items', 'delivery crew', dataset.delivery_crew, menu_items),
+        (5, 'orders-management-view', 'delivery crew', dataset.delivery_crew, orders),
+        (2, 'order-view', 'delivery crew', dataset.delivery_crew, order),
+        (2, 'delivery-queue-view', 'delivery crew', dataset.delivery_crew, claim),
+        (1, 'orders-management-view', 'manager', dataset.managers, orders),
+        (2, 'order-view', 'manager', dataset.managers, order),
+    ]
+
+
+def run_benchmark(dataset, requests=1000, seed=0, transport='wsgi', concurrency=1):
+    """
+        Sends the request mix through a test client and returns the stats per (url name, role) and the wall time.
+
+        * wsgi sends the requests one at a time through the synchronous handler behind LittleLemon/wsgi.py.
+        * asgi keeps up to concurrency requests in flight through the handler behind LittleLemon/asgi.py.
+    """
+    rng = random.Random(seed)
+    mix = scenarios(dataset)
+    weights = [weight for weight, *_ in mix]
+    plan = []
+    for _, url_name, role, users, build in rng.choices(mix, weights, k=requests):
+        method, path, kwargs = build(rng)
+        kwargs['headers'] = {'Authorization': f'Token {dataset.tokens[rng.choice(users)]}'}
+        plan.append((url_name, role, method, path, kwargs))
+    stats = {}
+
+    def record(url_name, role, method, path, response, elapsed, queries):
+        if response.status_code >= 500:
+            raise RuntimeError(f'{method.upper()} {path} failed with {response.status_code}')
+
+        endpoint = stats.setdefault((url_name, role), EndpointStats())
+        endpoint.durations.append(elapsed)
+        endpoint.queries.append(queries.count)
+
+    def run_wsgi():
+        client = Client()
+        for url_name, role, method, path, kwargs in plan:
+            with record_queries(QueryRecorder()) as queries:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                elapsed = time.perf_counter() - started
+            record(url_name, role, method, path, response, elapsed, queries)
+
+    async def run_asgi():
+        client = AsyncClient()
+        in_flight = asyncio.Semaphore(concurrency)
+
+        async def send(url_name, role, method, path, kwargs):
+            async with in_flight:
+                with record_queries(QueryRecorder()) as queries:
+                    started = time.perf_counter()
+                    response = await getattr(client, method)(path, **kwargs)
+                    elapsed = time.perf_counter() - started
+                record(url_name, role, method, path, response, elapsed, queries)
+
+        await asyncio.gather(*(send(*request) for request in plan))
+
+    # Rejected requests such as a checkout of an empty cart are part of the mix, keep them out of the report.
+    request_logger = logging.getLogger('django.request')
+    request_log_level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        with override_settings(ALLOWED_HOSTS=['testserver'], THROTTLE_RATES={}):
+            started = time.perf_counter()
+            if transport == 'asgi':
+                async_to_sync(run_asgi)()
+            else:
+                run_wsgi()
+            wall_time = time.perf_counter() - started
+    finally:
+        request_logger.setLevel(request_log_level)
+
+    return stats, wall_time
+
+
+@dataclass
+class SerializerStats:
+    rows: int
+    drf_seconds: float
+    fast_seconds: float
+    identical: bool
+
+
+def run_serializer_benchmark(dataset, repeat=3):
+    """
+        Renders the menu and the order feed of a manager with the DRF serializers and with the fast path.
+
+        * Both sides include their queries and the JSON encoding, the best of repeat runs is kept.
+        * identical tells whether the two paths produced the same bytes.
+    """
+    manager = User.objects.get(pk=dataset.managers[0])
+    menu_items = MenuItem.objects.filter(
+        pk__range=(dataset.menu_item_ids[0], dataset.menu_item_ids[-1])).order_by('id')
+    paths = {
+        'menu-items': (
+            lambda: JSONRenderer().render(MenuItemSerializer(menu_items, many=True).data),
+            lambda: dumps(menu_item_rows.data(menu_items)),
+        ),
+        'orders-management-view': (
+            lambda: JSONRenderer().render(OrderFeedSerializer(
+                order_feed(manager).prefetch_related(Prefetch('orderitem_set', OrderItem.objects.order_by('id'))),
+                many=True,
+            ).data),
+            lambda: dumps(order_feed_data(manager)),
+        ),
+    }
+
+    def best_of(render):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = render()
+            timings.append(time.perf_counter() - started)
+        return min(timings), content
+
+    stats = {}
+    for name, (drf, fast) in paths.items():
+        drf_seconds, drf_content = best_of(drf)
+        fast_seconds, fast_content = best_of(fast)
+        stats[name] = SerializerStats(
+            len(json.loads(drf_content)), drf_seconds, fast_seconds, drf_content == fast_content)
+
+    return stats
+
+
+@dataclass
+class RendererStats:
+    rows: int
+    seconds: float
+    size: int
+    compressed: dict
+
+
+# Renderers per format, the first one of each format is the DRF default the others are compared with.
+RENDERERS = {
+    'json': {
+        'drf': lambda rows: JSONRenderer().render(rows),
+        'fast': dumps,
+        'streamed': lambda rows: b''.join(stream_json(rows)),
+    },
+    'xml': {
+        'drf': lambda rows: XMLRenderer().render(rows).encode(),
+        'fast': lambda rows: FastXMLRenderer().render(rows).encode(),
+        'streamed': lambda rows: ''.join(FastXMLRenderer().stream(rows)).encode(),
+    },
+}
+
+
+def run_renderer_benchmark(dataset, repeat=3):
+    """
+        Renders the menu and the order feed of a manager in every format with every renderer,
+        then compresses the output with gzip and, when installed, brotli.
+
+        * The lists are serialized once up front, the timings cover rendering and compression only.
+          The best of repeat runs is kept.
+        * Returns the stats per (list, format, renderer) and the renderers whose output differs
+          from the DRF one of their format.
+    """
+    manager = User.objects.get(pk=dataset.managers[0])
+    menu_items = MenuItem.objects.filter(
+        pk__range=(dataset.menu_item_ids[0], dataset.menu_item_ids[-1])).order_by('id')
+    lists = {
+        'menu-items': menu_item_rows.data(menu_items),
+        'orders-management-view': order_feed_data(manager),
+    }
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+
+    def best_of(function, *args):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function(*args)
+            timings.append(time.perf_counter() - started)
+        return min(timings), result
+
+    stats = {}
+    different = []
+    for name, rows in lists.items():
+        for format, renderers in RENDERERS.items():
+            reference = None
+            for renderer, render in renderers.items():
+                seconds, content = best_of(render, rows)
+                if reference is None:
+                    reference = content
+                elif content != reference:
+                    different.append((name, format, renderer))
+
+                compressed = {}
+                for encoding in encodings:
+                    compressed[encoding] = best_of(lambda: len(b''.join(compress_chunks([content], encoding))))
+                stats[name, format, renderer] = RendererStats(len(rows), seconds, len(content), compressed)
+
+    return stats, different
@@ -0,0 +1,25 @@
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared_cache(alias='default'):
+    """
+        Returns whether every process of the deployment sees the same cache, local memory caches are private to one.
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """
+        Deploy check: roles, tokens, the catalogue version, idempotency keys and throttle counters
+        are only consistent across processes when the default cache is shared.
+    """
+    if is_shared_cache():
+        return []
+    return [checks.Warning(
+        'The default cache is private to each process.',
+        hint='Set CACHE_LOCATION to the URL of a Redis server shared by every process.',
+        id='LittleLemonAPI.W001',
+    )]
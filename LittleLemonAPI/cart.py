@@ -0,0 +1,135 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Cart, CartSummary, MenuItem
+
+MAX_LINE_PRICE = 10 ** 4
+# Subtotals of carts and totals of orders stay below the Order.total column.
+MAX_CART_TOTAL = 10 ** 4
+
+
+def update_cart(user, lines):
+    """
+        Adds menu items to the cart of the user or changes their quantity.
+
+        * lines is an iterable of (menuitem_id, quantity) pairs, a repeated menu item keeps its last quantity.
+        * Prices are taken from the menu and the batch is written with a single upsert.
+        * The cart summary is moved by the difference between the old and the new lines. A summary
+          created by this write is computed from the whole cart instead, the cart may hold older lines.
+        * A write that takes the subtotal to MAX_CART_TOTAL or more is rejected, the order could not hold it.
+    """
+    quantities = dict(lines)
+    prices = dict(MenuItem.objects.filter(pk__in=quantities).values_list('id', 'price'))
+
+    missing = sorted(set(quantities) - set(prices))
+    if missing:
+        raise ValidationError({'items': [f'Menu item {menuitem_id} does not exist.' for menuitem_id in missing]})
+
+    rows = []
+    for menuitem_id, quantity in quantities.items():
+        price = prices[menuitem_id] * quantity
+        if price >= MAX_LINE_PRICE:
+            raise ValidationError({'items': [f'Quantity {quantity} of menu item {menuitem_id} is too large.']})
+        rows.append(Cart(user=user, menuitem_id=menuitem_id, quantity=quantity,
+                         unit_price=prices[menuitem_id], price=price))
+
+    with transaction.atomic():
+        # Locking the summary row serializes concurrent writes to the same cart.
+        summary, created = CartSummary.objects.select_for_update().get_or_create(user=user)
+        if not created:
+            replaced = Cart.objects.filter(user=user, menuitem_id__in=quantities).aggregate(
+                item_count=Sum('quantity'), subtotal=Sum('price'))
+
+        Cart.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['menuitem', 'user'],
+            update_fields=['quantity', 'unit_price', 'price'],
+        )
+
+        if created:
+            totals = Cart.objects.filter(user=user).aggregate(item_count=Sum('quantity'), subtotal=Sum('price'))
+            item_count, subtotal = totals['item_count'] or 0, totals['subtotal'] or 0
+        else:
+            item_count = summary.item_count + sum(row.quantity for row in rows) - (replaced['item_count'] or 0)
+            subtotal = summary.subtotal + sum(row.price for row in rows) - (replaced['subtotal'] or 0)
+        if subtotal >= MAX_CART_TOTAL:
+            # Rolls the upsert back with the transaction.
+            raise ValidationError({'items': ['The cart total would be too large.']})
+
+        # The summary row is locked, so its new values can be written as they are.
+        CartSummary.objects.filter(user=user).update(item_count=item_count, subtotal=subtotal, modified=timezone.now())
+
+
+def summarize_carts(user_ids=None):
+    """
+        Writes the cart summaries of the users, every user with a cart by default, from their cart lines.
+
+        * One aggregate query and one upsert whatever the number of users.
+        * Summaries of the given users without cart lines are reset, the others are left as they are.
+    """
+    carts = Cart.objects.all() if user_ids is None else Cart.objects.filter(user_id__in=user_ids)
+    now = timezone.now()
+    summaries = [
+        CartSummary(user_id=user_id, item_count=item_count, subtotal=subtotal, modified=now)
+        for user_id, item_count, subtotal in carts.values('user_id').annotate(
+            item_count=Sum('quantity'), subtotal=Sum('price')).values_list('user_id', 'item_count', 'subtotal')
+    ]
+    CartSummary.objects.bulk_create(
+        summaries,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['item_count', 'subtotal', 'modified'],
+    )
+    if user_ids is not None:
+        CartSummary.objects.filter(user_id__in=user_ids).exclude(
+            user_id__in=[summary.user_id for summary in summaries]).update(item_count=0, subtotal=0, modified=now)
+
+
+def lock_carts(user_ids):
+    """
+        Locks the cart summaries of the users until the end of the transaction.
+
+        * Every write to carts takes these locks before touching the cart lines, so concurrent
+          writes to the same cart are serialized in one order and never deadlock.
+    """
+    list(CartSummary.objects.select_for_update().filter(user_id__in=user_ids).values_list('pk', flat=True))
+
+
+def delete_menu_item(item):
+    """
+        Deletes the menu item, its cart lines go with it, and writes the cart summaries that held it again.
+    """
+    with transaction.atomic():
+        user_ids = list(Cart.objects.filter(menuitem=item).values_list('user_id', flat=True))
+        lock_carts(user_ids)
+        item.delete()
+        summarize_carts(user_ids)
+
+
+def clear_cart(user):
+    """
+        Deletes every line in the cart of the user and resets the cart summary.
+    """
+    with transaction.atomic(savepoint=False):
+        lock_carts([user.pk])
+        empty_cart(user)
+
+
+def empty_cart(user):
+    """
+        clear_cart for callers that already hold the lock of the cart, see lock_carts.
+    """
+    Cart.objects.filter(user=user).delete()
+    CartSummary.objects.filter(user=user).update(item_count=0, subtotal=0, modified=timezone.now())
+
+
+def cart_summary(user):
+    """
+        Returns the item count, subtotal and last modification time of the cart without reading its lines.
+    """
+    summary = CartSummary.objects.filter(user=user).first()
+    return summary or CartSummary(user=user, modified=None)
@@ -0,0 +1,148 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.request import Request
+
+from .fast_serializers import FastSerializer, dumps
+from .models import MenuItem
+from .pagination import MenuItemCursorPagination
+from .renderers import render_bytes
+from .serializers import MenuItemSerializer, MenuItemFilterSerializer
+
+CATALOGUE_VERSION_KEY = 'menu-catalogue:version'
+CATALOGUE_TIMEOUT = 60 * 60
+# Formats whose rendered pages are cached, with their content type.
+CATALOGUE_FORMATS = {
+    'json': 'application/json',
+    'xml': 'application/xml; charset=utf-8',
+}
+
+menu_item_rows = FastSerializer(MenuItemSerializer)
+
+
+def catalogue_version():
+    """
+        Returns the current version of the menu catalogue.
+
+        * A missing counter is seeded from the clock, so an evicted version never reuses an old number.
+    """
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """
+        Invalidates every rendered catalogue, call it after any write to the menu.
+    """
+    try:
+        return cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        return catalogue_version()
+
+
+def filter_menu_items(queryset, query_params):
+    """
+        Applies the ?category=, ?featured=, ?min_price= and ?max_price= filters.
+    """
+    filters = MenuItemFilterSerializer(data=query_params.dict())
+    filters.is_valid(raise_exception=True)
+    params = filters.validated_data
+
+    if 'category' in params:
+        queryset = queryset.filter(category_id=params['category'])
+    if 'featured' in params:
+        queryset = queryset.filter(featured=params['featured'])
+    if 'min_price' in params:
+        queryset = queryset.filter(price__gte=params['min_price'])
+    if 'max_price' in params:
+        queryset = queryset.filter(price__lte=params['max_price'])
+
+    return queryset
+
+
+def build_menu_page(request):
+    """
+        Returns one filtered, keyset paginated page of the menu.
+
+        * The page is read with .values() and serialized by the fast path, the output matches MenuItemSerializer.
+    """
+    items = filter_menu_items(MenuItem.objects.all(), request.query_params)
+    paginator = MenuItemCursorPagination()
+    page = paginator.paginate_queryset(items.values(*menu_item_rows.columns), request)
+
+    return paginator.get_paginated_response([menu_item_rows.represent_dict(row) for row in page]).data
+
+
+def _catalogue_page_key(request, version, format):
+    query = request.get_host() + '?' + '&'.join(sorted(request.GET.urlencode().split('&')))
+    return f'menu-catalogue:{version}:{format}:{hashlib.md5(query.encode()).hexdigest()}'
+
+
+def _catalogue_etag(version, format):
+    return f'"menu-{version}"' if format == 'json' else f'"menu-{version}-{format}"'
+
+
+def get_catalogue(request, format='json'):
+    """
+        Returns the ETag and the rendered bytes of the requested menu page in one of CATALOGUE_FORMATS
+        for the current version.
+
+        * Every format is cached on its own, a cached page is never rendered again.
+    """
+    version = catalogue_version()
+    key = _catalogue_page_key(request, version, format)
+
+    content = cache.get(key)
+    if content is None:
+        content = render_bytes(build_menu_page(request), format)
+        cache.set(key, content, CATALOGUE_TIMEOUT)
+
+    return _catalogue_etag(version, format), content
+
+
+async def aget_catalogue(request):
+    """
+        Async version of get_catalogue, cache hits never leave the event loop.
+    """
+    version = await cache.aget(CATALOGUE_VERSION_KEY)
+    if version is None:
+        version = await sync_to_async(catalogue_version)()
+    key = _catalogue_page_key(request, version, 'json')
+
+    content = await cache.aget(key)
+    if content is None:
+        content = await sync_to_async(lambda: dumps(build_menu_page(Request(request))))()
+        await cache.aset(key, content, CATALOGUE_TIMEOUT)
+
+    return _catalogue_etag(version, 'json'), content
+
+
+def _catalogue_response(request, etag, content, format='json'):
+    # If-None-Match compares weakly, compressed responses carry the weak form of the ETag.
+    client_etags = {tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))}
+    if etag in client_etags or '*' in client_etags:
+        response = HttpResponseNotModified(headers={'ETag': etag})
+    else:
+        response = HttpResponse(content, content_type=CATALOGUE_FORMATS[format], headers={'ETag': etag})
+
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def catalogue_response(request, format='json'):
+    """
+        Serves the cached catalogue page, or 304 when the client already holds the current version.
+    """
+    return _catalogue_response(request, *get_catalogue(request, format), format)
+
+
+async def acatalogue_response(request):
+    return _catalogue_response(request, *await aget_catalogue(request))
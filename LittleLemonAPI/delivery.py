@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+
+from .events import order_changed
+from .models import Order
+
+CLAIM_ATTEMPTS = 5
+QUEUE_POLL_INTERVAL = 0.5
+MAX_QUEUE_WAIT = 25
+
+
+def claimable_orders():
+    """
+        Returns the undelivered orders nobody delivers yet, oldest first, served by order_undelivered_idx.
+    """
+    return Order.objects.filter(status=False, delivery_crew=None).order_by('date', 'id')
+
+
+def claim_next_order(user):
+    """
+        Assigns the oldest claimable order to the delivery crew user and returns it, None when the queue is empty.
+
+        * The candidate row is locked with SKIP LOCKED, so concurrent claims pass over each other's rows
+          instead of waiting for them.
+        * The assignment is a compare-and-set on delivery_crew, which also keeps backends without
+          row locks from handing one order to two users.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        with transaction.atomic():
+            order = claimable_orders().select_for_update(skip_locked=True).first()
+            if order is None:
+                return None
+
+            if Order.objects.filter(pk=order.pk, delivery_crew=None).update(delivery_crew=user):
+                order.delivery_crew = user
+                order_changed(order)
+                return order
+
+    return None
+
+
+def long_poll_wait(request, wait):
+    """
+        Returns the seconds a claim of the request may wait for an order, 0 unless it is served by LittleLemon.asgi.
+
+        * Under WSGI, or in a sync view, a waiting client would hold a worker thread for the whole wait.
+    """
+    return wait if isinstance(request, ASGIRequest) else 0
+
+
+async def aclaim_order(user, wait=0):
+    """
+        Claims the next order, polling for up to wait seconds while the queue is empty.
+
+        * A waiting client holds no thread between polls under ASGI, see long_poll_wait.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        order = await sync_to_async(claim_next_order)(user)
+        remaining = deadline - time.monotonic()
+        if order is not None or remaining <= 0:
+            return order
+        await asyncio.sleep(min(QUEUE_POLL_INTERVAL, remaining))
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .roles import MANAGER
+
+MANAGERS_CHANNEL = 'orders:managers'
+KEEPALIVE_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+
+
+def user_channel(user_id):
+    return f'orders:user:{user_id}'
+
+
+class Subscription:
+    """
+        Messages published to a set of channels, read with get() from the event loop that subscribed.
+    """
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def put(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+        except RuntimeError:
+            # The event loop of the subscriber is gone.
+            self.close()
+
+    async def get(self, timeout=None):
+        """
+            Returns the next message, raises asyncio.TimeoutError when none comes in within timeout seconds.
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """
+        Publish/subscribe between the threads and event loops of one process, for single node setups and tests.
+
+        * A broker is any class with publish(channel, message) and subscribe(channels) returning an object
+          with async get(timeout) and close(), settings.ORDER_EVENTS_BROKER names the one to use.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self.lock:
+            for channel in channels:
+                self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscriptions[channel]
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.ORDER_EVENTS_BROKER)()
+
+
+def order_channels(user, roles):
+    if MANAGER in roles:
+        return [MANAGERS_CHANNEL]
+    return [user_channel(user.pk)]
+
+
+def order_changed(order, previous_delivery_crew_id=None):
+    """
+        Publishes the status and delivery crew of the order once the current transaction commits.
+
+        * The customer, the delivery crew before and after the change and the managers are notified.
+    """
+    # The views may assign the raw request value to status.
+    status = order._meta.get_field('status').to_python(order.status)
+    message = {'id': order.pk, 'status': status, 'delivery_crew': order.delivery_crew_id}
+    user_ids = {order.user_id, order.delivery_crew_id, previous_delivery_crew_id} - {None}
+
+    def publish():
+        broker = get_broker()
+        for user_id in user_ids:
+            broker.publish(user_channel(user_id), message)
+        broker.publish(MANAGERS_CHANNEL, message)
+
+    transaction.on_commit(publish)
+
+
+async def order_event_stream(subscription):
+    """
+        Yields the messages of the subscription as Server-Sent Events, with a comment every
+        KEEPALIVE_SECONDS so proxies keep an idle connection open. Closes the subscription when the client leaves.
+    """
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        event_id = 0
+        while True:
+            try:
+                message = await subscription.get(KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            event_id += 1
+            yield f'id: {event_id}\nevent: order\ndata: {json.dumps(message)}\n\n'
+    finally:
+        subscription.close()
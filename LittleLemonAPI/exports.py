@@ -0,0 +1,92 @@
+import csv
+import io
+
+from .fast_serializers import dumps
+from .orders import order_rows, order_item_rows
+
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_HEADER = (
+    'order_id', 'user', 'delivery_crew', 'status', 'total', 'date',
+    'item_id', 'menuitem', 'quantity', 'unit_price', 'price',
+)
+
+
+def filter_export(orders, params):
+    """
+        Applies the validated ?start_date= and ?end_date= bounds, both inclusive.
+    """
+    if 'start_date' in params:
+        orders = orders.filter(date__gte=params['start_date'])
+    if 'end_date' in params:
+        orders = orders.filter(date__lte=params['end_date'])
+    return orders
+
+
+def _export_columns(items):
+    return order_rows.columns + [f'{items}__{column}' for column in order_item_rows.columns]
+
+
+def _export_rows(orders, archived=None):
+    """
+        Yields (order, item) pairs ordered by date, order and item, item is None for an order without items.
+
+        * One LEFT JOIN query read through a server-side cursor, EXPORT_CHUNK_SIZE rows at a time.
+          The archived orders are added to it with UNION ALL.
+    """
+    width = len(order_rows.columns)
+    rows = orders.order_by().values_list(*_export_columns('orderitem'))
+    if archived is not None:
+        rows = rows.union(archived.order_by().values_list(*_export_columns('archivedorderitem')), all=True)
+    rows = rows.order_by('date', 'id', 'orderitem__id')
+
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        item = order_item_rows.represent(row[width:]) if row[width] is not None else None
+        yield order_rows.represent(row), item
+
+
+def ndjson_export(orders, archived=None):
+    """
+        Yields the orders as newline delimited JSON, one order with its items per line.
+
+        * Lines are the objects of the order feed and are sent in batches of EXPORT_CHUNK_SIZE.
+    """
+    lines = []
+    current = None
+    for order, item in _export_rows(orders, archived):
+        if current is None or current['id'] != order['id']:
+            if current is not None:
+                lines.append(dumps(current))
+                if len(lines) >= EXPORT_CHUNK_SIZE:
+                    yield b'\n'.join(lines) + b'\n'
+                    lines = []
+            current = order
+            current['items'] = []
+        if item is not None:
+            current['items'].append(item)
+
+    if current is not None:
+        lines.append(dumps(current))
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def csv_export(orders, archived=None):
+    """
+        Yields the orders as CSV, one line per order item with the columns of its order.
+
+        * An order without items gets one line with empty item columns.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    no_item = dict.fromkeys(order_item_rows.names)
+
+    for count, (order, item) in enumerate(_export_rows(orders, archived), 1):
+        writer.writerow([*order.values(), *(item or no_item).values()])
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
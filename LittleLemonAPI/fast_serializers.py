@@ -0,0 +1,112 @@
+import decimal
+import json
+
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+else:
+    # orjson formats these itself, leave them to JSONRenderer.
+    _ORJSON_PASSTHROUGH = orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def _decimal_getter(field):
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    if not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+        return lambda value: value.quantize(quantum, rounding=rounding, context=context)
+    return lambda value: f'{value.quantize(quantum, rounding=rounding, context=context):f}'
+
+
+def _field_getter(field):
+    """
+        Returns the function that turns a database value into the output of the field, None for no conversion.
+    """
+    if isinstance(field, serializers.DecimalField) and not (field.localize or field.normalize_output) \
+            and field.decimal_places is not None:
+        return _decimal_getter(field)
+    if isinstance(field, serializers.DateTimeField):
+        raise TypeError('DateTimeField depends on the active time zone and has no fast path.')
+    if isinstance(field, serializers.DateField) \
+            and str(getattr(field, 'format', api_settings.DATE_FORMAT)).lower() == 'iso-8601':
+        return lambda value: value.isoformat()
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None
+    if isinstance(field, (serializers.IntegerField, serializers.BooleanField, serializers.CharField)):
+        return None
+    raise TypeError(f'{type(field).__name__} {field.field_name!r} has no fast path.')
+
+
+class FastSerializer:
+    """
+        Read-only fast path for flat ModelSerializers, used by the list endpoints.
+
+        * Rows come from .values_list() or .values() and every field is converted by a getter
+          precompiled from the serializer field, so the output matches the serializer exactly.
+        * Nested serializers and fields that need the model instance are rejected when the getters are compiled.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def fields(self):
+        return [field for field in self.serializer_class().fields.values() if not field.write_only]
+
+    @cached_property
+    def names(self):
+        return [field.field_name for field in self.fields]
+
+    @cached_property
+    def columns(self):
+        return [field.source for field in self.fields]
+
+    @cached_property
+    def getters(self):
+        return [(index, getter) for index, getter in enumerate(map(_field_getter, self.fields)) if getter]
+
+    def rows(self, queryset, *extra_columns):
+        """
+            Returns the value tuples of the queryset, extra columns are appended after the serialized ones.
+        """
+        return queryset.values_list(*self.columns, *extra_columns)
+
+    def represent(self, row):
+        names, getters = self.names, self.getters
+        row = list(row[:len(names)])
+        for index, getter in getters:
+            if row[index] is not None:
+                row[index] = getter(row[index])
+        return dict(zip(names, row))
+
+    def represent_dict(self, row):
+        return self.represent([row[column] for column in self.columns])
+
+    def data(self, queryset):
+        represent = self.represent
+        return [represent(row) for row in self.rows(queryset)]
+
+
+def dumps(data):
+    """
+        Encodes data exactly like the DRF JSONRenderer with the default settings, using orjson when installed.
+
+        * Data holding types plain JSON does not know (Decimal, datetime, lazy strings) goes through JSONRenderer.
+    """
+    try:
+        if orjson is not None:
+            content = orjson.dumps(data, option=_ORJSON_PASSTHROUGH)
+        else:
+            content = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+    except (TypeError, ValueError):
+        return JSONRenderer().render(data)
+    return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,81 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_TIMEOUT = 60 * 60 * 24
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+# Marker stored while the first request with a key is still running.
+_IN_PROGRESS = 'in-progress'
+
+
+def _cache_key(request, key):
+    # Keys are chosen by clients, scope them to the user and keep their length out of the cache key.
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'idempotency:{request.user.pk}:{request.path}:{digest}'
+
+
+def _lock_timeout():
+    # The lock outlives the longest request the server lets run, so a retry never runs the view while
+    # the first request still does. It only expires on its own when that request was killed.
+    return settings.REQUEST_TIMEOUT + 5
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def idempotent(view):
+    """
+        Replays the stored response of a POST that repeats the Idempotency-Key header of an earlier one.
+
+        * Goes below @api_view, the user is authenticated and the body parsed when it runs.
+        * The status and data of the first response are kept in the default cache for IDEMPOTENCY_TIMEOUT
+          seconds, a retry gets them back without running the view. Raised errors and server errors
+          are not stored, so the request can be retried.
+        * A retry while the first request still runs gets 409, a key reused with another body gets 422.
+          The first request holds the key until its response is stored, see settings.REQUEST_TIMEOUT.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if request.method != 'POST' or key is None:
+            return view(request, *args, **kwargs)
+
+        if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return Response({'message': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} characters!'},
+                            status.HTTP_400_BAD_REQUEST)
+
+        cache_key = _cache_key(request, key)
+        fingerprint = _fingerprint(request)
+        if not cache.add(cache_key, _IN_PROGRESS, _lock_timeout()):
+            stored = cache.get(cache_key)
+            if stored is None or stored == _IN_PROGRESS:
+                return Response({'message': 'a request with this idempotency key is in progress!'},
+                                status.HTTP_409_CONFLICT)
+
+            stored_fingerprint, status_code, data = stored
+            if stored_fingerprint != fingerprint:
+                return Response({'message': 'the idempotency key was used with another payload!'},
+                                status.HTTP_422_UNPROCESSABLE_ENTITY)
+            return Response(data, status_code, headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        if response.status_code >= 500 or not isinstance(response, Response):
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, (fingerprint, response.status_code, response.data), IDEMPOTENCY_TIMEOUT)
+        return response
+
+    return wrapper
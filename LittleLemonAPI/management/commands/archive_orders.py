@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.archiving import ARCHIVE_BATCH_SIZE, archive_horizon, archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves the delivered orders older than --days days (settings.ORDER_ARCHIVE_AFTER_DAYS by default) '
+        'with their items to the archive tables, one transaction per --batch-size orders.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int)
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        before = archive_horizon(options['days'])
+        archived = archive_orders(before, options['batch_size'])
+        self.stdout.write(f'Archived {archived} orders dated before {before}.')
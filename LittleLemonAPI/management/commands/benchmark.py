@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from LittleLemonAPI.authentication import invalidate_tokens
+from LittleLemonAPI.benchmarks import QUERY_BUDGETS, run_benchmark, seed_dataset
+from LittleLemonAPI.catalogue import bump_catalogue_version
+from LittleLemonAPI.roles import invalidate_roles
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a synthetic dataset, drives every API endpoint with a customer, delivery crew and manager '
+        'request mix and reports latency percentiles, throughput and SQL queries per request. '
+        'Fails when an endpoint exceeds its query budget. The dataset is rolled back unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--menu-items', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--transport', choices=['wsgi', 'asgi'], default='wsgi',
+            help='Drive the WSGI handler one request at a time or the ASGI handler with --concurrency requests in flight.',
+        )
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--keep', action='store_true', help='Commit the seeded dataset instead of rolling it back.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            dataset = seed_dataset(options['users'], options['menu_items'], options['orders'], options['seed'])
+            self.stdout.write(
+                f"Seeded {options['users']} users, {options['menu_items']} menu items and {options['orders']} orders."
+            )
+            stats, wall_time = run_benchmark(
+                dataset, options['requests'], options['seed'], options['transport'], options['concurrency'])
+            transaction.set_rollback(not options['keep'])
+
+        if not options['keep']:
+            bump_catalogue_version()
+            invalidate_roles(*dataset.tokens)
+            invalidate_tokens(*dataset.tokens.values())
+
+        self.stdout.write(
+            f"{'endpoint':<24} {'role':<14} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'req/s':>8} {'queries':>8} {'max':>4} {'budget':>6}"
+        )
+        over_budget = []
+        for (url_name, role), endpoint in sorted(stats.items()):
+            budget = QUERY_BUDGETS[url_name]
+            most_queries = max(endpoint.queries)
+            self.stdout.write(
+                f'{url_name:<24} {role:<14} {len(endpoint.durations):>8} '
+                f'{endpoint.percentile(50) * 1000:>8.2f} {endpoint.percentile(95) * 1000:>8.2f} '
+                f'{endpoint.percentile(99) * 1000:>8.2f} {len(endpoint.durations) / sum(endpoint.durations):>8.0f} '
+                f'{sum(endpoint.queries) / len(endpoint.queries):>8.1f} {most_queries:>4} {budget:>6}'
+            )
+            if most_queries > budget:
+                over_budget.append(f'{url_name} ({role}) ran {most_queries} queries, the budget is {budget}')
+
+        self.stdout.write(f"{options['transport']}: {options['requests'] / wall_time:.0f} requests per second overall.")
+
+        if over_budget:
+            raise CommandError('Query budget exceeded: ' + '; '.join(over_budget))
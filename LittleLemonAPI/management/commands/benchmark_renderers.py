@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from LittleLemonAPI.benchmarks import run_renderer_benchmark, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds --rows menu items and orders and compares the render cost and size of the menu and of the '
+        'order feed of a manager per format and renderer, with the cost of compressing them. '
+        'Fails when a renderer output differs from the DRF one. The dataset is always rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            dataset = seed_dataset(users=100, menu_items=options['rows'], orders=options['rows'], seed=options['seed'])
+            stats, different = run_renderer_benchmark(dataset, options['repeat'])
+            transaction.set_rollback(True)
+
+        encodings = next(iter(stats.values())).compressed
+        self.stdout.write(
+            f"{'list':<24} {'format':<6} {'renderer':<9} {'rows':>7} {'ms':>8} {'KB':>9}"
+            + ''.join(f' {encoding + " KB":>9} {encoding + " ms":>9}' for encoding in encodings)
+        )
+        for (name, format, renderer), result in stats.items():
+            self.stdout.write(
+                f'{name:<24} {format:<6} {renderer:<9} {result.rows:>7} {result.seconds * 1000:>8.1f} '
+                f'{result.size / 1024:>9.1f}'
+                + ''.join(f' {size / 1024:>9.1f} {seconds * 1000:>9.1f}'
+                          for seconds, size in result.compressed.values())
+            )
+
+        if different:
+            raise CommandError('The output differs from the DRF renderer for: '
+                               + ', '.join(' '.join(key) for key in different))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from LittleLemonAPI.benchmarks import run_serializer_benchmark, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds --rows menu items and orders and compares the DRF serializers with the fast serialization path '
+        'on the full menu and on the order feed of a manager. Fails when the outputs differ. '
+        'The dataset is always rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            dataset = seed_dataset(users=100, menu_items=options['rows'], orders=options['rows'], seed=options['seed'])
+            stats = run_serializer_benchmark(dataset, options['repeat'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'endpoint':<24} {'rows':>8} {'drf ms':>9} {'fast ms':>9} {'speedup':>8} {'identical':>9}")
+        different = []
+        for name, result in stats.items():
+            self.stdout.write(
+                f'{name:<24} {result.rows:>8} {result.drf_seconds * 1000:>9.1f} {result.fast_seconds * 1000:>9.1f} '
+                f'{result.drf_seconds / result.fast_seconds:>7.1f}x {str(result.identical):>9}'
+            )
+            if not result.identical:
+                different.append(name)
+
+        if different:
+            raise CommandError('The fast path output differs from the serializers for: ' + ', '.join(different))
@@ -0,0 +1,49 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.menu_import import import_menu, read_csv_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates or updates menu items from a JSON list or a CSV file with title, price, featured, '
+        'category (id or slug) and optionally id columns. Nothing is written when a row is invalid '
+        'unless --partial is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['json', 'csv'], help='Defaults to the extension of the file.')
+        parser.add_argument('--partial', action='store_true', help='Write the valid rows even when some are invalid.')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the rows.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        text = path.read_text(encoding='utf-8')
+
+        if file_format == 'csv':
+            rows = read_csv_rows(text)
+        elif file_format == 'json':
+            rows = json.loads(text)
+            if isinstance(rows, dict):
+                rows = rows.get('items')
+            if not isinstance(rows, list):
+                raise CommandError('Expected a list of menu items.')
+        else:
+            raise CommandError(f'Unknown format {file_format!r}, pass --format json or --format csv.')
+
+        report = import_menu(rows, partial=options['partial'], dry_run=options['dry_run'])
+
+        for entry in report['rows']:
+            if entry['status'] == 'invalid':
+                self.stdout.write(f"row {entry['row']}: {json.dumps(entry['errors'])}")
+        self.stdout.write(
+            f"{'Checked' if options['dry_run'] else 'Imported'} {len(rows)} rows: {report['created']} created, "
+            f"{report['updated']} updated, {report['invalid']} invalid, {report['skipped']} skipped."
+        )
+
+        if report['invalid'] and not options['partial']:
+            raise CommandError('Nothing was imported, fix the invalid rows or pass --partial.')
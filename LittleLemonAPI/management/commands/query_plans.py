@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.query_plans import query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        'Prints the EXPLAIN output of the main query of every view next to the index it is expected to use. '
+        'Fails when a plan does not use its index.'
+    )
+
+    def handle(self, *args, **options):
+        missing = []
+        for name, index, plan in query_plans():
+            uses_index = index in plan
+            self.stdout.write(f"{name} (expects {index}{'' if uses_index else ', NOT USED'}):")
+            self.stdout.write('\n'.join(f'    {line}' for line in plan.splitlines()))
+            if not uses_index:
+                missing.append(f'{name} does not use {index}')
+
+        if missing:
+            raise CommandError('; '.join(missing))
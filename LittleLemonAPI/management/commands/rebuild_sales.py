@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.sales import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily sales rollups from the full order history in one transaction.'
+
+    def handle(self, *args, **options):
+        written = rebuild_sales()
+        self.stdout.write(f'Wrote {written} daily sales rows.')
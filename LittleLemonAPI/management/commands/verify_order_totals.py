@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.exports import filter_export
+from LittleLemonAPI.models import ArchivedOrder, Order
+from LittleLemonAPI.orders import order_total_mismatches
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the totals of the orders dated from --start-date to --end-date, both inclusive, '
+        'from the prices of their items in SQL and reports the orders whose total differs. '
+        'Archived orders are verified as well.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=datetime.date.fromisoformat)
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat)
+
+    def handle(self, *args, **options):
+        bounds = {name: options[name] for name in ('start_date', 'end_date') if options[name] is not None}
+        mismatches = [
+            *order_total_mismatches(filter_export(Order.objects.all(), bounds)),
+            *order_total_mismatches(filter_export(ArchivedOrder.objects.all(), bounds), 'archivedorderitem'),
+        ]
+        for order_id, date, total, items_total in mismatches:
+            self.stdout.write(f'Order {order_id} of {date}: total {total:.2f}, items {items_total:.2f}.')
+
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} orders do not match the prices of their items.')
+        self.stdout.write('Every order total matches the prices of its items.')
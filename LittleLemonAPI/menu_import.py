@@ -0,0 +1,132 @@
+import csv
+import io
+
+from django.db import transaction
+from django.db.models import Q
+
+from .catalogue import bump_catalogue_version
+from .models import Category, MenuItem
+from .serializers import MenuItemImportSerializer
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_FIELDS = ('title', 'price', 'featured', 'category')
+
+
+def read_csv_rows(text):
+    """
+        Returns the rows of a CSV document with a header line, empty cells are left out.
+    """
+    return [{name: value for name, value in row.items() if value not in ('', None)}
+            for row in csv.DictReader(io.StringIO(text))]
+
+
+def _category_key(value):
+    return ('id', int(value)) if str(value).isdigit() else ('slug', value)
+
+
+def _resolve(rows):
+    """
+        Loads the categories and the existing menu items the rows refer to, one query each.
+    """
+    keys = {_category_key(row['category']) for row in rows}
+    categories = {}
+    for category in Category.objects.filter(
+            Q(pk__in=[value for kind, value in keys if kind == 'id'])
+            | Q(slug__in=[value for kind, value in keys if kind == 'slug'])):
+        categories[('id', category.pk)] = category
+        categories[('slug', category.slug)] = category
+
+    ids = [row['id'] for row in rows if 'id' in row]
+    titles = [row['title'] for row in rows if 'id' not in row]
+    by_id, by_title = {}, {}
+    for item in MenuItem.objects.filter(Q(pk__in=ids) | Q(title__in=titles)):
+        by_id[item.pk] = item
+        by_title.setdefault(item.title, []).append(item)
+
+    return categories, by_id, by_title
+
+
+def import_menu(rows, partial=False, dry_run=False):
+    """
+        Creates or updates menu items from rows of title, price, featured, category and an optional id,
+        returns the report of the import.
+
+        * category is the id or the slug of the category. A row without id updates the menu item
+          with the same title, or creates one when there is none.
+        * featured is optional, an updated item without it keeps its own and a created one is not featured.
+        * Every row is validated before anything is written. An invalid row aborts the whole import
+          unless partial is set, then only the valid rows are written.
+        * Rows are written with bulk_create and bulk_update in one transaction and the catalogue
+          version is bumped once.
+    """
+    report = [{'row': number} for number in range(1, len(rows) + 1)]
+    valid = []
+    for entry, row in zip(report, rows):
+        serializer = MenuItemImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((entry, serializer.validated_data))
+        else:
+            entry.update(status='invalid', errors=serializer.errors)
+
+    categories, by_id, by_title = _resolve([data for _, data in valid])
+    to_create, to_update, seen = [], [], {}
+    for entry, data in valid:
+        key = ('id', data['id']) if 'id' in data else ('title', data['title'])
+        category = categories.get(_category_key(data['category']))
+        if key in seen:
+            errors = {'non_field_errors': [f'Duplicate of row {seen[key]}.']}
+        elif category is None:
+            errors = {'category': [f'Category {data["category"]!r} does not exist.']}
+        elif 'id' in data and data['id'] not in by_id:
+            errors = {'id': [f'Menu item {data["id"]} does not exist.']}
+        elif 'id' not in data and len(by_title.get(data['title'], ())) > 1:
+            errors = {'title': [f'Several menu items are titled {data["title"]!r}, give the id.']}
+        else:
+            errors = None
+        seen.setdefault(key, entry['row'])
+        if errors:
+            entry.update(status='invalid', errors=errors)
+            continue
+
+        values = {**{name: data[name] for name in IMPORT_FIELDS if name != 'category' and name in data},
+                  'category': category}
+        item = by_id.get(data['id']) if 'id' in data else next(iter(by_title.get(data['title'], ())), None)
+        if item is not None and ('item', item.pk) in seen:
+            duplicate_of = seen[('item', item.pk)]
+            entry.update(status='invalid', errors={'non_field_errors': [f'Duplicate of row {duplicate_of}.']})
+            continue
+        if item is None:
+            item = MenuItem(**{'featured': False, **values})
+            to_create.append((entry, item))
+            entry['status'] = 'created'
+        else:
+            for name, value in values.items():
+                setattr(item, name, value)
+            to_update.append(item)
+            seen[('item', item.pk)] = entry['row']
+            entry.update(status='updated', id=item.pk)
+
+    invalid = sum(entry['status'] == 'invalid' for entry in report)
+    if dry_run or (invalid and not partial) or not (to_create or to_update):
+        if invalid and not partial:
+            for entry in report:
+                if entry['status'] != 'invalid':
+                    entry['status'] = 'skipped'
+                    entry.pop('id', None)
+        return _summary(report)
+
+    with transaction.atomic():
+        MenuItem.objects.bulk_create([item for _, item in to_create], batch_size=IMPORT_BATCH_SIZE)
+        MenuItem.objects.bulk_update(to_update, IMPORT_FIELDS, batch_size=IMPORT_BATCH_SIZE)
+    for entry, item in to_create:
+        entry['id'] = item.pk
+    bump_catalogue_version()
+
+    return _summary(report)
+
+
+def _summary(report):
+    counts = {'created': 0, 'updated': 0, 'invalid': 0, 'skipped': 0}
+    for entry in report:
+        counts[entry['status']] += 1
+    return {**counts, 'rows': report}
@@ -0,0 +1,82 @@
+import threading
+from bisect import bisect_left
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name: (help text, buckets)
+METRICS = {
+    'request_duration_seconds': ('Wall time spent handling the request.', DURATION_BUCKETS),
+    'db_duration_seconds': ('Time spent in SQL queries while handling the request.', DURATION_BUCKETS),
+    'db_queries': ('SQL queries run while handling the request.', QUERY_BUCKETS),
+    'db_duplicate_queries': ('SQL queries repeated with the same parameters within the request.', QUERY_BUCKETS),
+    'response_bytes': ('Size of the response body, streaming responses are not counted.', BYTES_BUCKETS),
+}
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+class Histogram:
+    """
+        Fixed bucket histogram, counts[i] holds the observations that fall in bucket i (the last one is +Inf).
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def observe(view, **values):
+    """
+        Records one request of the view, values are keyed by metric name.
+    """
+    with _lock:
+        for name, value in values.items():
+            histogram = _histograms.get((name, view))
+            if histogram is None:
+                histogram = _histograms[(name, view)] = Histogram(METRICS[name][1])
+            histogram.observe(value)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def render_prometheus():
+    """
+        Returns every histogram in the Prometheus text exposition format.
+    """
+    with _lock:
+        snapshot = {
+            key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+            for key, histogram in _histograms.items()
+        }
+
+    lines = []
+    for name, (help_text, _) in METRICS.items():
+        metric = f'littlelemon_{name}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+
+        for (metric_name, view), (buckets, counts, total, count) in sorted(snapshot.items()):
+            if metric_name != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {total}')
+            lines.append(f'{metric}_count{{view="{view}"}} {count}')
+
+    return '\n'.join(lines) + '\n'
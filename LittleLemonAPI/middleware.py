@@ -0,0 +1,369 @@
+import logging
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from . import metrics
+from .authentication import aauthenticate_token, authenticate_token
+from .fast_serializers import dumps
+from .roles import aget_roles, get_roles
+from .throttling import athrottle_wait, client_address, throttle_wait, throttled_views
+from .routers import primary_pinning, wrote_to_primary, replica_aliases, pin_user_to_primary
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+GZIP_LEVEL = 6
+# Brotli levels above 5 cost more CPU than they save bytes on dynamic responses.
+BROTLI_QUALITY = 5
+
+
+class QueryRecorder:
+    """
+        Collects the timing of the queries of a record_queries block and spots repeated ones.
+    """
+
+    def __init__(self, keep_sql=False):
+        self.keep_sql = keep_sql
+        self.count = 0
+        self.duration = 0
+        self.seen = set()
+        self.duplicates = 0
+        self.statements = []
+
+    def record(self, elapsed, sql, params):
+        self.count += 1
+        self.duration += elapsed
+
+        fingerprint = (sql, str(params))
+        if fingerprint in self.seen:
+            self.duplicates += 1
+        else:
+            self.seen.add(fingerprint)
+
+        if self.keep_sql:
+            self.statements.append((elapsed, sql, params))
+
+
+_active_recorders = ContextVar('query_recorders', default=())
+
+
+def _record_query(execute, sql, params, many, context):
+    recorders = _active_recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for recorder in recorders:
+            recorder.record(elapsed, sql, params)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@contextmanager
+def record_queries(recorder):
+    """
+        Feeds every query run inside the block, on any connection, to the recorder.
+
+        * Connections are per thread, so the recorders travel in a context variable and follow
+          async code into the threads its ORM calls run in. Blocks can be nested.
+    """
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(None, connection)
+
+    token = _active_recorders.set(_active_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _active_recorders.reset(token)
+
+
+class MetricsMiddleware:
+    """
+        Records wall time, SQL time, query count, duplicate queries and response size per URL name.
+
+        * Requests slower than settings.METRICS_SLOW_REQUEST_SECONDS are logged with their SQL.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder, started = self.start()
+        with record_queries(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder, started = self.start()
+        with record_queries(recorder):
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, started)
+
+    def start(self):
+        slow_request_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', None)
+        return QueryRecorder(keep_sql=slow_request_seconds is not None), time.perf_counter()
+
+    def finish(self, request, response, recorder, started):
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unresolved'
+        values = {
+            'request_duration_seconds': elapsed,
+            'db_duration_seconds': recorder.duration,
+            'db_queries': recorder.count,
+            'db_duplicate_queries': recorder.duplicates,
+        }
+        if not response.streaming:
+            values['response_bytes'] = len(response.content)
+        metrics.observe(view, **values)
+
+        slow_request_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', None)
+        if slow_request_seconds is not None and elapsed >= slow_request_seconds:
+            logger.warning(
+                'Slow request %s %s (%s) took %.3fs with %d queries in %.3fs:\n%s',
+                request.method, request.path, view, elapsed, recorder.count, recorder.duration,
+                '\n'.join(f'[{duration:.4f}s] {sql} {params}' for duration, sql, params in recorder.statements),
+            )
+
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+        Keeps a user who just wrote to the primary reading from it for DATABASE_REPLICATION_LAG seconds.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with primary_pinning():
+            response = self.get_response(request)
+            self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        with primary_pinning():
+            response = await self.get_response(request)
+            if wrote_to_primary() and replica_aliases():
+                # Resolving a lazy session user touches the database.
+                await sync_to_async(self.pin)(request)
+        return response
+
+    def pin(self, request):
+        user = getattr(request, 'user', None)
+        if wrote_to_primary() and replica_aliases() and user is not None and user.is_authenticated:
+            pin_user_to_primary(user)
+
+
+def accepted_encodings(header):
+    """
+        Returns the content codings of an Accept-Encoding header that are not refused with q=0.
+    """
+    encodings = set()
+    for entry in header.split(','):
+        coding, *params = [part.strip() for part in entry.split(';')]
+        refused = False
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    refused = float(value) <= 0
+                except ValueError:
+                    refused = True
+        if coding and not refused:
+            encodings.add(coding.lower())
+    return encodings
+
+
+def _stream_compressor(encoding):
+    """
+        Returns the compress, flush and finish functions of a streaming compressor for the encoding.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def compress_chunks(chunks, encoding):
+    compress, flush, finish = _stream_compressor(encoding)
+    for chunk in chunks:
+        # Flushed chunk by chunk, a client reading a slow stream gets every chunk as soon as it is rendered.
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+async def acompress_chunks(chunks, encoding):
+    compress, flush, finish = _stream_compressor(encoding)
+    async for chunk in chunks:
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """
+        Compresses responses of at least settings.COMPRESSION_MIN_SIZE bytes with brotli, when it is installed
+        and accepted by the client, or with gzip.
+
+        * Streaming responses are always compressed, chunk by chunk. Server-Sent Events are left alone,
+          each event has to reach the client as it is sent.
+        * Strong ETags are made weak, like GZipMiddleware does, so If-None-Match still matches them.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if response.has_header('Content-Encoding') or response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_chunks(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_chunks(response.streaming_content, encoding)
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            else:
+                # Random bytes in the gzip header, as GZipMiddleware adds them, to mitigate BREACH.
+                content = compress_string(response.content, max_random_bytes=100)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class ThrottleMiddleware:
+    """
+        Answers 429 to requests over the rate of the role of the user on the endpoint, see settings.THROTTLE_RATES.
+
+        * Runs before any view, so the native async views are throttled like the DRF ones. Token users
+          are authenticated from the token cache, others from the session, so it goes after AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        url_name = self.url_name(request)
+        if url_name is not None:
+            user = authenticate_token(request) or request.user
+            wait = throttle_wait(url_name, user, get_roles(user), client_address(request))
+            if wait is not None:
+                return self.throttled(wait)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        url_name = self.url_name(request)
+        if url_name is not None:
+            user = await aauthenticate_token(request) or await request.auser()
+            wait = await athrottle_wait(url_name, user, await aget_roles(user), client_address(request))
+            if wait is not None:
+                return self.throttled(wait)
+        return await self.get_response(request)
+
+    def url_name(self, request):
+        """
+            Returns the URL name of the request, None when nothing is throttled or the path is unknown
+            or served by a view outside LittleLemonAPI/urls.py.
+        """
+        if not getattr(settings, 'THROTTLE_RATES', None):
+            return None
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return None
+        if match.func not in throttled_views():
+            return None
+        return match.url_name or ''
+
+    def throttled(self, wait):
+        return HttpResponse(
+            dumps({'detail': f'Request was throttled. Expected available in {wait} seconds.'}),
+            content_type='application/json', status=429, headers={'Retry-After': str(wait)},
+        )
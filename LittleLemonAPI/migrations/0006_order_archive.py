@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def partition_archive(apps, schema_editor):
+    """
+        On PostgreSQL with settings.ORDER_ARCHIVE_PARTITIONED, recreates the order archive as a table
+        partitioned by range of date. archive_orders creates the yearly partitions.
+    """
+    if schema_editor.connection.vendor != 'postgresql' or not getattr(settings, 'ORDER_ARCHIVE_PARTITIONED', False):
+        return
+
+    ArchivedOrder = apps.get_model('LittleLemonAPI', 'ArchivedOrder')
+    table = schema_editor.quote_name(ArchivedOrder._meta.db_table)
+    unpartitioned = schema_editor.quote_name(ArchivedOrder._meta.db_table + '_unpartitioned')
+    schema_editor.execute(f'ALTER TABLE {table} RENAME TO {unpartitioned}')
+    # Indexes are created again below, the primary key one would not hold the partition key.
+    schema_editor.execute(
+        f'CREATE TABLE {table} (LIKE {unpartitioned} INCLUDING ALL EXCLUDING INDEXES) PARTITION BY RANGE ("date")')
+    schema_editor.execute(f'DROP TABLE {unpartitioned}')
+    # The primary key of a partitioned table has to hold the partition key.
+    schema_editor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY ("id", "date")')
+    for field in ArchivedOrder._meta.local_fields:
+        # db_index fields, the index of date serves the date range of the export.
+        for statement in schema_editor._field_indexes_sql(ArchivedOrder, field):
+            schema_editor.execute(statement)
+    for index in ArchivedOrder._meta.indexes:
+        schema_editor.add_index(ArchivedOrder, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0005_order_cart_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.BooleanField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('date', models.DateField(db_index=True)),
+                ('delivery_crew', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_deliveries', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.SmallIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('menuitem', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='LittleLemonAPI.menuitem')),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='LittleLemonAPI.archivedorder')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'date'], name='archivedorder_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['delivery_crew', 'date'], name='archivedorder_crew_date_idx'),
+        ),
+        migrations.RunPython(partition_archive, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def backfill_cart_summaries(apps, schema_editor):
+    # Carts filled before the summaries existed, see LittleLemonAPI.cart.summarize_carts.
+    Cart = apps.get_model('LittleLemonAPI', 'Cart')
+    CartSummary = apps.get_model('LittleLemonAPI', 'CartSummary')
+    now = timezone.now()
+    CartSummary.objects.bulk_create(
+        [
+            CartSummary(user_id=user_id, item_count=item_count, subtotal=subtotal, modified=now)
+            for user_id, item_count, subtotal in Cart.objects.values('user_id').annotate(
+                item_count=Sum('quantity'), subtotal=Sum('price')).values_list('user_id', 'item_count', 'subtotal')
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['item_count', 'subtotal', 'modified'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0006_order_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_cart_summaries, migrations.RunPython.noop),
+    ]
@@ -19,22 +19,41 @@ class MenuItem(models.Model):
         return f'{self.title} {self.price}'
 
 class Cart(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     price= models.DecimalField(max_digits=6, decimal_places=2)
 
     class Meta:
-        unique_together = ('menuitem', 'user')
+        # User first, every cart query filters on the user.
+        unique_together = ('user', 'menuitem')
+
+class CartSummary(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    item_count = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.user} {self.item_count} {self.subtotal}'
     
 class Order(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="delivery_crew", null=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="delivery_crew", null=True, db_index=False)
     status = models.BooleanField(db_index=True,default=0)
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True)
 
+    class Meta:
+        # The user and delivery crew columns lead these indexes, so their foreign keys need no index of their own.
+        indexes = [
+            models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'status', 'date'], name='order_crew_status_date_idx'),
+            models.Index(
+                fields=['delivery_crew', 'date'], condition=models.Q(status=False), name='order_undelivered_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user} {self.delivery_crew}'
 
@@ -46,4 +65,46 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2)
 
     class Meta:
-        unique_together=('order','menuitem')
\ No newline at end of file
+        unique_together=('order','menuitem')
+
+class ArchivedOrder(models.Model):
+    # Orders keep their id in the archive. The archive is only written by archive_orders, its foreign keys
+    # have no database constraints so the table can be partitioned by date on PostgreSQL.
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='archived_orders', db_index=False, db_constraint=False)
+    delivery_crew = models.ForeignKey(
+        User, on_delete=models.SET_NULL, related_name='archived_deliveries', null=True, db_index=False,
+        db_constraint=False)
+    status = models.BooleanField(default=0)
+    total = models.DecimalField(max_digits=6, decimal_places=2)
+    date = models.DateField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='archivedorder_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='archivedorder_crew_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.delivery_crew}'
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, db_constraint=False)
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE, db_constraint=False)
+    quantity = models.SmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+
+class DailySales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'menuitem')
+
+    def __str__(self):
+        return f'{self.date} {self.menuitem_id} {self.units} {self.revenue}'
@@ -0,0 +1,161 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cart import MAX_CART_TOTAL, empty_cart, lock_carts
+from .fast_serializers import FastSerializer
+from .models import ArchivedOrder, ArchivedOrderItem, Cart, Order, OrderItem
+from .roles import is_manager, is_delivery_crew
+from .sales import apply_sales
+from .serializers import OrderSerializer, OrderFeedItemSerializer
+
+order_rows = FastSerializer(OrderSerializer)
+order_item_rows = FastSerializer(OrderFeedItemSerializer)
+
+
+def _visible_orders(user, orders):
+    if is_delivery_crew(user):
+        return orders.filter(delivery_crew=user)
+    if is_manager(user):
+        return orders
+    return orders.filter(user=user)
+
+
+def order_feed(user):
+    """
+        Returns the orders visible to the user, newest first.
+
+        * Delivery crew see the orders assigned to them, managers see every order
+          and customers see their own orders.
+    """
+    return _visible_orders(user, Order.objects.order_by('-date', '-id'))
+
+
+def archived_order_feed(user):
+    """
+        Returns the archived orders visible to the user, by the same rules as order_feed.
+    """
+    return _visible_orders(user, ArchivedOrder.objects.order_by('-date', '-id'))
+
+
+def _order_feed_rows(user):
+    """
+        Returns the order and the item rows of the feed, the current and the archived ones read by one UNION ALL each.
+    """
+    orders, archived = order_feed(user), archived_order_feed(user)
+    items = OrderItem.objects.filter(order__in=orders.values('id'))
+    archived_items = ArchivedOrderItem.objects.filter(order__in=archived.values('id'))
+    return (
+        order_rows.rows(orders.order_by()).union(order_rows.rows(archived.order_by()), all=True)
+        .order_by('-date', '-id'),
+        order_item_rows.rows(items, 'order_id').union(order_item_rows.rows(archived_items, 'order_id'), all=True)
+        .order_by('id'),
+    )
+
+
+def _group_order_feed(orders, items):
+    grouped = {}
+    for row in items:
+        grouped.setdefault(row[-1], []).append(order_item_rows.represent(row))
+
+    feed = []
+    for row in orders:
+        order = order_rows.represent(row)
+        order['items'] = grouped.get(order['id'], [])
+        feed.append(order)
+    return feed
+
+
+def order_feed_data(user):
+    """
+        Returns the serialized feed of the user, the same data OrderFeedSerializer gives for order_feed.
+
+        * Orders and items are read as value tuples and go through the fast path,
+          two queries however many orders and items the feed holds.
+        * Archived orders are part of the feed.
+    """
+    orders, items = _order_feed_rows(user)
+    return _group_order_feed(list(orders), list(items))
+
+
+def order_total_mismatches(orders, items='orderitem'):
+    """
+        Returns (id, date, total, items total) of the orders whose total differs from the sum of the prices
+        of their items, oldest first. The sums are computed by the database.
+
+        * items is the name of the relation to the items, archivedorderitem for archived orders.
+        * An order without items has an items total of 0.
+    """
+    # Rounded, SQLite sums decimals as floats.
+    items_total = Round(Coalesce(Sum(f'{items}__price'), Value(Decimal(0))), 2, output_field=DecimalField())
+    return (
+        orders.annotate(items_total=items_total)
+        .exclude(total=F('items_total'))
+        .order_by('date', 'id')
+        .values_list('id', 'date', 'total', 'items_total')
+    )
+
+
+async def aorder_feed_data(user):
+    orders, items = _order_feed_rows(user)
+    return _group_order_feed([row async for row in orders], [row async for row in items])
+
+
+def order_items_data(order_id):
+    """
+        Returns the items of the order, or of the archived order, as the order feed represents them,
+        None when there is no such order.
+
+        * The prices are the ones snapshotted at checkout, the menu is not read.
+    """
+    if Order.objects.filter(pk=order_id).exists():
+        items = OrderItem.objects.filter(order_id=order_id)
+    elif ArchivedOrder.objects.filter(pk=order_id).exists():
+        items = ArchivedOrderItem.objects.filter(order_id=order_id)
+    else:
+        return None
+    return [order_item_rows.represent(row) for row in order_item_rows.rows(items.order_by('id'))]
+
+
+def place_order(user):
+    """
+        Turns the cart of the user into an order and empties the cart, returns None when the cart is empty.
+
+        * The cart summary, then the cart rows, stay locked until the order is committed, so a double submit
+          places one order and finds an empty cart the second time. Cart writes lock in the same order.
+        * The prices of the cart lines, taken from the menu and checked against MAX_LINE_PRICE when they
+          were added, are snapshotted into the order items and the total is their sum. The customer pays
+          what the cart showed, later menu price changes never change an order.
+        * A cart whose total is MAX_CART_TOTAL or more, which Order.total cannot hold, is rejected with a
+          ValidationError. update_cart keeps carts below it, older carts may not be.
+        * The items are added to the daily sales rollups in the same transaction.
+        * Costs a fixed number of queries however many items are in the cart.
+    """
+    with transaction.atomic():
+        lock_carts([user.pk])
+        cart = Cart.objects.filter(user=user)
+        lines = list(cart.select_for_update().values_list('menuitem_id', 'quantity', 'unit_price', 'price'))
+        if not lines:
+            return None
+
+        total = sum(price for *_, price in lines)
+        if total >= MAX_CART_TOTAL:
+            raise ValidationError({'cart': ['The cart total is too large for one order.']})
+
+        order = Order.objects.create(
+            user=user,
+            total=total,
+            date=timezone.localdate(),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem_id=menuitem_id, quantity=quantity, unit_price=unit_price, price=price)
+            for menuitem_id, quantity, unit_price, price in lines
+        ])
+        apply_sales(order.date, [(menuitem_id, quantity, price) for menuitem_id, quantity, _, price in lines])
+        empty_cart(user)
+
+    return order
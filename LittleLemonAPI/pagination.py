@@ -0,0 +1,30 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+
+class MenuItemCursorPagination(CursorPagination):
+    """
+        Keyset pagination over the indexed menu item columns.
+
+        * ?ordering= accepts title, price or id, prefixed with '-' for descending order.
+        * Ties are broken by id, so pages stay stable while items are added.
+    """
+    page_size = 20
+    page_size_query_param = 'perpage'
+    max_page_size = 100
+    ordering = 'id'
+    ordering_param = 'ordering'
+    ordering_fields = ('id', 'title', 'price')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_param)
+        if not ordering:
+            return (self.ordering,)
+
+        field = ordering.lstrip('-')
+        if field not in self.ordering_fields:
+            raise ValidationError({self.ordering_param: f'Unsupported ordering {ordering!r}.'})
+
+        if field == 'id':
+            return (ordering,)
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
@@ -0,0 +1,19 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .menu_import import read_csv_rows
+
+
+class CSVParser(BaseParser):
+    """
+        Parses a text/csv body with a header line into a list of dicts.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            return read_csv_rows(stream.read().decode(encoding))
+        except (UnicodeDecodeError, ValueError) as exc:
+            raise ParseError(f'CSV parse error - {exc}')
@@ -0,0 +1,59 @@
+import datetime
+
+from django.contrib.auth.models import User
+
+from .delivery import claimable_orders
+from .exports import filter_export
+from .models import Cart, Order, OrderItem
+from .orders import archived_order_feed, order_feed
+from .roles import DELIVERY_CREW
+from .sales import sales_report
+
+# Name, or name prefix for indexes Django names itself, of the index each query shape is expected to use.
+EXPECTED_INDEXES = {
+    'orders-management-view (customer)': 'order_user_date_idx',
+    'orders-management-view (delivery crew)': 'order_crew_status_date_idx',
+    'orders-management-view (items)': 'LittleLemonAPI_orderitem_order_id',
+    'orders-management-view (archive)': 'archivedorder_user_date_idx',
+    'orders-export-view': 'LittleLemonAPI_order_date',
+    'delivery-queue-view': 'order_undelivered_idx',
+    'cart-management-view': 'LittleLemonAPI_cart_user_id_menuitem_id',
+    'sales-report-view': 'LittleLemonAPI_dailysales_date_menuitem_id',
+}
+
+
+def _user_with_roles(*roles):
+    user = User(pk=1)
+    user._roles = frozenset(roles)
+    return user
+
+
+def query_shapes():
+    """
+        Returns the main query of each view by name, built by the same code as the views.
+    """
+    customer = _user_with_roles()
+    crew = _user_with_roles(DELIVERY_CREW)
+    start_date, end_date = datetime.date(2023, 1, 1), datetime.date(2023, 1, 31)
+    customer_orders = order_feed(customer)
+
+    return {
+        'orders-management-view (customer)': customer_orders,
+        'orders-management-view (delivery crew)': order_feed(crew),
+        'orders-management-view (items)': OrderItem.objects.filter(order__in=customer_orders.values('id')),
+        'orders-management-view (archive)': archived_order_feed(customer),
+        'orders-export-view': filter_export(Order.objects.order_by('date', 'id'), {
+            'start_date': start_date, 'end_date': end_date}),
+        'delivery-queue-view': claimable_orders(),
+        'cart-management-view': Cart.objects.filter(user=customer).order_by('id'),
+        'sales-report-view': sales_report({
+            'start_date': start_date, 'end_date': end_date, 'group': 'menuitem', 'per_day': True}),
+    }
+
+
+def query_plans():
+    """
+        Yields (name, expected index, plan) for every query shape, the plan is the output of EXPLAIN.
+    """
+    for name, queryset in query_shapes().items():
+        yield name, EXPECTED_INDEXES[name], queryset.explain()
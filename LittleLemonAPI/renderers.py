@@ -0,0 +1,158 @@
+import re
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.encoding import force_str
+from django.utils.xmlutils import UnserializableContentError
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework_xml.renderers import XMLRenderer
+
+from .fast_serializers import dumps
+
+# Lists with at least this many rows are streamed, STREAM_CHUNK_ROWS rows per chunk.
+STREAM_MIN_ROWS = 1000
+STREAM_CHUNK_ROWS = 500
+
+_control_characters = re.compile(r'[\x00-\x08\x0B-\x0C\x0E-\x1F]')
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class FastXMLRenderer(XMLRenderer):
+    """
+        XMLRenderer that builds the document from a list of strings instead of SAX events,
+        the output is the same as the one of rest_framework_xml.
+
+        * stream() yields the document of a list in chunks of rows.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+
+        parts = [self._prologue()]
+        self._append(parts, data)
+        parts.append(f'</{self.root_tag_name}>')
+        return ''.join(parts)
+
+    def stream(self, rows, chunk_rows=STREAM_CHUNK_ROWS):
+        yield self._prologue()
+        for chunk in _chunks(rows, chunk_rows):
+            parts = []
+            self._append(parts, chunk)
+            yield ''.join(parts)
+        yield f'</{self.root_tag_name}>'
+
+    def _prologue(self):
+        return f'<?xml version="1.0" encoding="{self.charset}"?>\n<{self.root_tag_name}>'
+
+    def _append(self, parts, data):
+        if isinstance(data, (list, tuple)):
+            start, end = f'<{self.item_tag_name}>', f'</{self.item_tag_name}>'
+            for item in data:
+                parts.append(start)
+                self._append(parts, item)
+                parts.append(end)
+
+        elif isinstance(data, dict):
+            for key, value in data.items():
+                parts.append(f'<{key}>')
+                self._append(parts, value)
+                parts.append(f'</{key}>')
+
+        elif data is not None:
+            content = force_str(data)
+            if _control_characters.search(content):
+                raise UnserializableContentError('Control characters are not supported in XML 1.0')
+            parts.append(escape(content))
+
+
+async def aiterate(chunks):
+    """
+        Yields the chunks of a sync iterator that does not block, such as one rendering rows already loaded.
+    """
+    for chunk in chunks:
+        yield chunk
+
+
+async def _apull(chunks):
+    chunks = iter(chunks)
+    done = object()
+    try:
+        while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def streaming_content(request, chunks, blocking=False):
+    """
+        Returns the chunks as the streaming content of a response to the request.
+
+        * Under ASGI Django reads a sync iterator to the end before sending anything, the response then
+          gets an async iterator instead. Chunks of a blocking iterator, such as one reading the database,
+          are pulled one at a time through sync_to_async.
+    """
+    if not isinstance(getattr(request, '_request', request), ASGIRequest):
+        return chunks
+    return _apull(chunks) if blocking else aiterate(chunks)
+
+
+def stream_json(rows, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+        Yields the JSON array of the rows in chunks, the joined chunks equal dumps(rows).
+    """
+    yield b'['
+    separator = b''
+    for chunk in _chunks(rows, chunk_rows):
+        yield separator + dumps(chunk)[1:-1]
+        separator = b','
+    yield b']'
+
+
+def render_bytes(data, format):
+    """
+        Returns data rendered in the json or xml format, the same bytes the DRF view would send.
+    """
+    if format == 'json':
+        return dumps(data)
+    if format == 'xml':
+        return FastXMLRenderer().render(data).encode(FastXMLRenderer.charset)
+    raise ValueError(f'No fast renderer for the {format!r} format.')
+
+
+def list_response(request, rows):
+    """
+        Returns the response of a list for the renderer DRF negotiated.
+
+        * JSON is encoded by the fast path. JSON and XML lists of STREAM_MIN_ROWS rows or more are streamed,
+          so the response never holds the whole document and compression starts with the first chunk,
+          under ASGI too, see streaming_content.
+        * Other formats, such as the browsable API, get a regular Response.
+    """
+    format = request.accepted_renderer.format
+    streamed = len(rows) >= STREAM_MIN_ROWS
+    if format == 'json':
+        if streamed:
+            return StreamingHttpResponse(streaming_content(request, stream_json(rows)), content_type='application/json')
+        return HttpResponse(dumps(rows), content_type='application/json')
+
+    if format == 'xml' and streamed:
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, FastXMLRenderer):
+            renderer = FastXMLRenderer()
+        return StreamingHttpResponse(
+            streaming_content(request, renderer.stream(rows)),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}')
+
+    return Response(rows, status.HTTP_200_OK)
@@ -0,0 +1,115 @@
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+
+from .caching import is_shared_cache
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery crew'
+
+ROLES_CACHE_TIMEOUT = 60 * 15
+MAX_BULK_USERNAMES = 1000
+
+
+def _roles_cache_key(user_id):
+    return f'roles:{user_id}'
+
+
+def get_roles(user):
+    """
+        Returns the names of the groups the user belongs to.
+
+        * Memberships are loaded at most once per request and kept on the user instance.
+        * Across requests they are kept in the default cache until invalidate_roles is called, only when
+          the cache is shared: invalidate_roles could not reach the private caches of other processes.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_roles', None)
+    if roles is None:
+        shared = is_shared_cache()
+        key = _roles_cache_key(user.pk)
+        roles = cache.get(key) if shared else None
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            if shared:
+                cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+        user._roles = roles
+
+    return roles
+
+
+async def aget_roles(user):
+    """
+        Async version of get_roles, memoizes the roles on the user instance the same way.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_roles', None)
+    if roles is None:
+        shared = is_shared_cache()
+        key = _roles_cache_key(user.pk)
+        roles = await cache.aget(key) if shared else None
+        if roles is None:
+            roles = frozenset([name async for name in user.groups.values_list('name', flat=True)])
+            if shared:
+                await cache.aset(key, roles, ROLES_CACHE_TIMEOUT)
+        user._roles = roles
+
+    return roles
+
+
+def is_manager(user):
+    return MANAGER in get_roles(user)
+
+
+def is_delivery_crew(user):
+    return DELIVERY_CREW in get_roles(user)
+
+
+def is_customer(user):
+    return user.is_authenticated and not get_roles(user) & {MANAGER, DELIVERY_CREW}
+
+
+def invalidate_roles(*user_ids):
+    """
+        Drops the cached memberships of the given users, call it after group membership changes.
+    """
+    cache.delete_many([_roles_cache_key(user_id) for user_id in user_ids])
+
+
+def change_memberships(group_name, usernames, add=True):
+    """
+        Adds the users to the group, or removes them with add=False, and returns a status per username.
+
+        * A fixed number of queries however many usernames: one user lookup, one membership lookup
+          and one bulk insert into or delete from the through table.
+        * The cached roles of the changed users are invalidated at once.
+        * The group is created when it does not exist yet.
+    """
+    group, _ = Group.objects.get_or_create(name=group_name)
+    usernames = list(dict.fromkeys(usernames))
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+    memberships = User.groups.through
+    members = set(memberships.objects.filter(group=group, user_id__in=user_ids.values())
+                  .values_list('user_id', flat=True))
+
+    if add:
+        changed = [user_id for user_id in user_ids.values() if user_id not in members]
+        memberships.objects.bulk_create(
+            [memberships(user_id=user_id, group=group) for user_id in changed], ignore_conflicts=True)
+        statuses = ('added', 'already a member')
+    else:
+        changed = [user_id for user_id in user_ids.values() if user_id in members]
+        memberships.objects.filter(group=group, user_id__in=changed).delete()
+        statuses = ('removed', 'not a member')
+    invalidate_roles(*changed)
+
+    changed = set(changed)
+    return [
+        {'username': username, 'status': 'not found' if username not in user_ids
+            else statuses[0] if user_ids[username] in changed else statuses[1]}
+        for username in usernames
+    ]
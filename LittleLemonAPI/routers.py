@@ -0,0 +1,112 @@
+import random
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+def _pin_cache_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+@contextmanager
+def replica_reads(user):
+    """
+        Lets the reads inside the block go to a replica.
+
+        * Users who wrote within the last DATABASE_REPLICATION_LAG seconds keep reading from the primary.
+    """
+    if not replica_aliases() or (user.is_authenticated and cache.get(_pin_cache_key(user.pk))):
+        yield
+        return
+
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(user):
+    """
+        Async version of replica_reads for the native async views, the pin is read without blocking the loop.
+    """
+    if not replica_aliases() or (user.is_authenticated and await cache.aget(_pin_cache_key(user.pk))):
+        yield
+        return
+
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_pinning():
+    """
+        Tracks whether the code inside the block wrote to the database, see wrote_to_primary.
+    """
+    token = _pinned_to_primary.set(False)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def wrote_to_primary():
+    return _pinned_to_primary.get()
+
+
+def pin_user_to_primary(user):
+    cache.set(_pin_cache_key(user.pk), True, settings.DATABASE_REPLICATION_LAG)
+
+
+class PrimaryReplicaRouter:
+    """
+        Sends reads inside replica_reads blocks to a random replica and everything else to the primary.
+
+        * Once a request writes, its later reads stay on the primary.
+    """
+
+    def __init__(self):
+        self.replicas = replica_aliases()
+
+    def db_for_read(self, model, **hints):
+        if self.replicas and _replica_reads.get() and not _pinned_to_primary.get():
+            return random.choice(self.replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _pinned_to_primary.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def reads_from_replica(view):
+    """
+        Runs the GET requests of a view inside replica_reads, other methods stay on the primary.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return view(request, *args, **kwargs)
+        with replica_reads(request.user):
+            return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,130 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import groupby, islice
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Sum, Value, When
+
+from .models import ArchivedOrderItem, DailySales, OrderItem
+
+REBUILD_BATCH_SIZE = 1000
+
+_keeping_sales = ContextVar('keeping_sales', default=False)
+
+
+def apply_sales(date, lines, sign=1):
+    """
+        Adds sold items to the rollup of the date, or takes them away with sign=-1.
+
+        * lines is an iterable of (menuitem_id, units, revenue) triples, repeated menu items are added up.
+        * Missing rollup rows are inserted first, then every row of the batch is moved by a single UPDATE.
+    """
+    totals = {}
+    for menuitem_id, units, revenue in lines:
+        total_units, total_revenue = totals.get(menuitem_id, (0, 0))
+        totals[menuitem_id] = (total_units + units, total_revenue + revenue)
+    if not totals:
+        return
+
+    DailySales.objects.bulk_create(
+        [DailySales(date=date, menuitem_id=menuitem_id) for menuitem_id in totals],
+        ignore_conflicts=True,
+    )
+    DailySales.objects.filter(date=date, menuitem_id__in=totals).update(
+        units=F('units') + Case(
+            *[When(menuitem_id=menuitem_id, then=Value(sign * units)) for menuitem_id, (units, _) in totals.items()],
+            output_field=IntegerField(),
+        ),
+        revenue=F('revenue') + Case(
+            *[When(menuitem_id=menuitem_id, then=Value(sign * revenue)) for menuitem_id, (_, revenue) in totals.items()],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+def order_sales(order):
+    """
+        Returns the (menuitem_id, units, revenue) triples of the order.
+    """
+    return OrderItem.objects.filter(order=order).values_list('menuitem').annotate(Sum('quantity'), Sum('price'))
+
+
+def move_order_sales(order, old_date):
+    """
+        Moves the items of an order whose date changed from the rollup of old_date to the new one.
+    """
+    if order.date == old_date:
+        return
+
+    lines = list(order_sales(order))
+    with transaction.atomic(savepoint=False):
+        apply_sales(old_date, lines, sign=-1)
+        apply_sales(order.date, lines)
+
+
+@contextmanager
+def keeping_sales():
+    """
+        Orders deleted inside the block stay in the rollups, for orders that are moved rather than removed.
+    """
+    token = _keeping_sales.set(True)
+    try:
+        yield
+    finally:
+        _keeping_sales.reset(token)
+
+
+def remove_order_sales(sender, instance, **kwargs):
+    """
+        pre_delete receiver of Order, takes the items of a deleted order out of the rollups.
+    """
+    if not _keeping_sales.get():
+        apply_sales(instance.date, order_sales(instance), sign=-1)
+
+
+def rebuild_sales():
+    """
+        Recomputes every rollup row from the order history and the order archive, returns the number of rows written.
+
+        * The archived items are added date by date, a date may have both archived and current orders.
+    """
+    totals = OrderItem.objects.values_list('order__date', 'menuitem').annotate(Sum('quantity'), Sum('price'))
+    archived = ArchivedOrderItem.objects.values_list('order__date', 'menuitem').annotate(Sum('quantity'), Sum('price'))
+
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        rows = totals.order_by().iterator(chunk_size=REBUILD_BATCH_SIZE)
+        while batch := list(islice(rows, REBUILD_BATCH_SIZE)):
+            DailySales.objects.bulk_create([
+                DailySales(date=date, menuitem_id=menuitem_id, units=units, revenue=revenue)
+                for date, menuitem_id, units, revenue in batch
+            ])
+
+        rows = archived.order_by('order__date').iterator(chunk_size=REBUILD_BATCH_SIZE)
+        for date, lines in groupby(rows, key=lambda row: row[0]):
+            apply_sales(date, [line[1:] for line in lines])
+
+        return DailySales.objects.count()
+
+
+def sales_report(params):
+    """
+        Returns units and revenue per menu item, or per category with group=category, over the date range.
+
+        * per_day adds the date to the grouping, for daily series.
+    """
+    rows = DailySales.objects.exclude(units=0, revenue=0)
+    if 'start_date' in params:
+        rows = rows.filter(date__gte=params['start_date'])
+    if 'end_date' in params:
+        rows = rows.filter(date__lte=params['end_date'])
+
+    keys = ['date'] if params['per_day'] else []
+    if params['group'] == 'category':
+        rows = rows.values(*keys, category=F('menuitem__category'))
+        keys.append('category')
+    else:
+        keys.append('menuitem')
+        rows = rows.values(*keys)
+
+    return rows.annotate(units=Sum('units'), revenue=Sum('revenue')).order_by(*keys)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import MenuItem, Cart, OrderItem, Order
+from .delivery import MAX_QUEUE_WAIT
+from .models import MenuItem, Cart, CartSummary, OrderItem, Order
+from .roles import MAX_BULK_USERNAMES
 from django.contrib.auth.models import User
 
 class MenuItemSerializer(serializers.ModelSerializer):
@@ -17,6 +19,15 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ('id','menuitem', 'quantity','unit_price','price')
 
+class CartLineSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=32767)
+
+class CartSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CartSummary
+        fields = ('item_count','subtotal','modified')
+
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -28,3 +39,62 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ('id','order','menuitem', 'quantity','unit_price','price')
 
+class OrderFeedItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ('id','menuitem', 'quantity','unit_price','price')
+
+class OrderFeedSerializer(serializers.ModelSerializer):
+    items = OrderFeedItemSerializer(source='orderitem_set', many=True, read_only=True)
+    class Meta:
+        model = Order
+        fields = ('id','user','delivery_crew','status', 'total','date','items')
+
+
+class MenuItemFilterSerializer(serializers.Serializer):
+    category = serializers.IntegerField(required=False)
+    featured = serializers.BooleanField(required=False)
+    min_price = serializers.DecimalField(max_digits=6, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=6, decimal_places=2, required=False)
+
+class DateRangeFilterSerializer(serializers.Serializer):
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if 'start_date' in data and 'end_date' in data and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError('start_date must not be after end_date.')
+        return data
+
+class OrderExportFilterSerializer(DateRangeFilterSerializer):
+    type = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+
+class SalesReportFilterSerializer(DateRangeFilterSerializer):
+    group = serializers.ChoiceField(choices=['menuitem', 'category'], default='menuitem')
+    per_day = serializers.BooleanField(default=False)
+
+class SalesReportSerializer(serializers.Serializer):
+    date = serializers.DateField(required=False)
+    menuitem = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class DeliveryQueueSerializer(serializers.Serializer):
+    wait = serializers.IntegerField(min_value=0, max_value=MAX_QUEUE_WAIT, default=0)
+
+class MenuItemImportSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0)
+    featured = serializers.BooleanField(required=False)
+    category = serializers.CharField(max_length=50)
+
+class MenuImportOptionsSerializer(serializers.Serializer):
+    partial = serializers.BooleanField(default=False)
+    dry_run = serializers.BooleanField(default=False)
+
+
+class BulkMembershipSerializer(serializers.Serializer):
+    usernames = serializers.ListField(
+        child=serializers.CharField(max_length=150), allow_empty=False, max_length=MAX_BULK_USERNAMES)
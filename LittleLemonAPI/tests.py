@@ -1,3 +1,1444 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import gzip
+import importlib
+import json
+import os
+import tempfile
+import time
+import warnings
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils.xmlutils import UnserializableContentError
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_xml.renderers import XMLRenderer
+
+from . import metrics
+from .authentication import CachingTokenAuthentication, TokenCache, local_tokens
+from .caching import check_shared_cache
+from .cart import summarize_carts
+from .catalogue import menu_item_rows
+from .fast_serializers import dumps
+from .models import Category, MenuItem, Cart, CartSummary, Order, OrderItem, DailySales, ArchivedOrder, ArchivedOrderItem
+from .delivery import claim_next_order
+from .events import MANAGERS_CHANNEL, get_broker, user_channel
+from .middleware import accepted_encodings, brotli
+from .orders import order_feed, order_feed_data
+from .query_plans import query_plans
+from .renderers import FastXMLRenderer, stream_json
+from .routers import PrimaryReplicaRouter, areplica_reads, replica_reads, pin_user_to_primary, primary_pinning
+from .sales import rebuild_sales
+from .roles import MANAGER, DELIVERY_CREW, get_roles, is_manager, is_delivery_crew, change_memberships
+from .serializers import MenuItemSerializer, OrderFeedSerializer
+from .throttling import CacheThrottleStore, get_throttle_store, sliding_window_wait
+
+def shared_cache(test):
+    """
+        The test cache is local memory, tests of what is cached across requests run as if it were shared.
+    """
+    for module in ('roles', 'authentication'):
+        test = mock.patch(f'LittleLemonAPI.{module}.is_shared_cache', new=mock.Mock(return_value=True))(test)
+    return test
+
+
+class RolesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.managers = Group.objects.create(name=MANAGER)
+        self.delivery_crew = Group.objects.create(name=DELIVERY_CREW)
+        self.manager = User.objects.create_user('manager')
+        self.managers.user_set.add(self.manager)
+        self.customer = User.objects.create_user('customer')
+
+    def test_roles_are_loaded_once_per_request(self):
+        user = User.objects.get(pk=self.manager.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_manager(user))
+            self.assertFalse(is_delivery_crew(user))
+            self.assertEqual(get_roles(user), {MANAGER})
+
+    @shared_cache
+    def test_roles_are_cached_across_requests(self):
+        get_roles(User.objects.get(pk=self.manager.pk))
+
+        user = User.objects.get(pk=self.manager.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_manager(user))
+
+    def test_roles_are_not_cached_across_requests_in_a_private_cache(self):
+        get_roles(User.objects.get(pk=self.manager.pk))
+
+        user = User.objects.get(pk=self.manager.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_manager(user))
+        self.assertEqual(check_shared_cache(None)[0].id, 'LittleLemonAPI.W001')
+
+    def test_membership_views_invalidate_cached_roles(self):
+        self.assertFalse(is_delivery_crew(User.objects.get(pk=self.customer.pk)))
+
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        client.post(reverse('delivery-crew-view'), {'username': 'customer'})
+
+        self.assertTrue(is_delivery_crew(User.objects.get(pk=self.customer.pk)))
+
+    def test_bulk_membership_changes_create_a_missing_group(self):
+        self.delivery_crew.delete()
+
+        results = change_memberships(DELIVERY_CREW, ['customer'])
+
+        self.assertEqual(results, [{'username': 'customer', 'status': 'added'}])
+        self.assertTrue(is_delivery_crew(User.objects.get(pk=self.customer.pk)))
+
+    def test_bulk_membership_changes_report_every_username(self):
+        for number in range(20):
+            User.objects.create_user(f'crew{number}')
+        self.delivery_crew.user_set.add(User.objects.get(username='crew0'))
+        usernames = [f'crew{number}' for number in range(20)] + ['nobody', 'crew1']
+
+        with self.assertNumQueries(4):
+            results = change_memberships(DELIVERY_CREW, usernames)
+        self.assertEqual(len(results), 21)
+        self.assertEqual(results[0], {'username': 'crew0', 'status': 'already a member'})
+        self.assertEqual(results[1], {'username': 'crew1', 'status': 'added'})
+        self.assertEqual(results[-1], {'username': 'nobody', 'status': 'not found'})
+        self.assertEqual(self.delivery_crew.user_set.count(), 20)
+
+        with self.assertNumQueries(4):
+            results = change_memberships(DELIVERY_CREW, ['crew0', 'crew1', 'customer'], add=False)
+        self.assertEqual([result['status'] for result in results], ['removed', 'removed', 'not a member'])
+        self.assertEqual(self.delivery_crew.user_set.count(), 18)
+
+    def test_bulk_membership_view_invalidates_cached_roles(self):
+        self.assertFalse(is_manager(User.objects.get(pk=self.customer.pk)))
+        url = reverse('managers-group-bulk')
+
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        self.assertEqual(client.post(url, {'usernames': ['customer']}, format='json').status_code, 403)
+
+        client.force_authenticate(self.manager)
+        response = client.post(url, {'usernames': ['customer']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'username': 'customer', 'status': 'added'}])
+        self.assertTrue(is_manager(User.objects.get(pk=self.customer.pk)))
+
+        response = client.delete(url, {'usernames': ['customer']}, format='json')
+        self.assertEqual(response.data['results'], [{'username': 'customer', 'status': 'removed'}])
+        self.assertFalse(is_manager(User.objects.get(pk=self.customer.pk)))
+
+        self.assertEqual(client.post(url, {'usernames': []}, format='json').status_code, 400)
+
+
+@shared_cache
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.customer = User.objects.create_user('customer')
+        self.token = Token.objects.create(user=self.customer)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_tokens_cost_no_query(self):
+        self.client.get(reverse('cart-summary-view'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart-summary-view'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_invalidates_the_token(self):
+        self.client.get(reverse('cart-summary-view'))
+
+        self.client.post('/auth/token/logout/')
+
+        self.assertEqual(self.client.get(reverse('cart-summary-view')).status_code, 401)
+
+    def test_deactivation_invalidates_the_token(self):
+        self.client.get(reverse('cart-summary-view'))
+
+        self.customer.is_active = False
+        self.customer.save()
+
+        self.assertEqual(self.client.get(reverse('cart-summary-view')).status_code, 401)
+
+    def test_requests_get_their_own_copy_of_the_user(self):
+        first, _ = CachingTokenAuthentication().authenticate_credentials(self.token.key)
+        first.note = 'set during one request'
+
+        second, token = CachingTokenAuthentication().authenticate_credentials(self.token.key)
+
+        self.assertEqual(second, self.customer)
+        self.assertIsNot(second, first)
+        self.assertFalse(hasattr(second, 'note'))
+        self.assertIs(token.user, second)
+
+    def test_password_hashes_are_not_cached(self):
+        user, _ = CachingTokenAuthentication().authenticate_credentials(self.token.key)
+        user, _ = CachingTokenAuthentication().authenticate_credentials(self.token.key)
+
+        self.assertNotIn('password', user.__dict__)
+        user.first_name = 'Changed'
+        user.save()
+        self.assertEqual(User.objects.get(pk=self.customer.pk).password, self.customer.password)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.password, self.customer.password)
+
+    def test_private_caches_only_keep_tokens_in_process(self):
+        with mock.patch('LittleLemonAPI.authentication.is_shared_cache', return_value=False):
+            CachingTokenAuthentication().authenticate_credentials(self.token.key)
+            local_tokens.clear()
+
+            with self.assertNumQueries(1):
+                CachingTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def test_lru_is_bounded_and_expires(self):
+        tokens = TokenCache(maxsize=2, timeout=60)
+        for key in 'abc':
+            tokens.set(key, (self.customer, self.token))
+
+        self.assertIsNone(tokens.get('a'))
+        self.assertIsNotNone(tokens.get('c'))
+        with mock.patch('LittleLemonAPI.authentication.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(tokens.get('c'))
+
+
+class MenuCatalogueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(slug='mains', title='Mains')
+        MenuItem.objects.create(title='Pasta', price='9.50', featured=False, category=self.category)
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_catalogue_is_served_from_cache(self):
+        first = self.client.get(reverse('menu-items'))
+        self.assertEqual(first.json()['results'][0]['title'], 'Pasta')
+
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('menu-items'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get(reverse('menu-items'))['ETag']
+
+        response = self.client.get(reverse('menu-items'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_bump_the_catalogue_version(self):
+        etag = self.client.get(reverse('menu-items'))['ETag']
+        item = MenuItem.objects.get()
+
+        self.client.delete(reverse('menu-item', args=[item.pk]))
+
+        response = self.client.get(reverse('menu-items'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_every_format_is_cached_on_its_own(self):
+        json_response = self.client.get(reverse('menu-items'))
+        first = self.client.get(reverse('menu-items'), {'format': 'xml'})
+        self.assertIn(b'<title>Pasta</title>', first.content)
+        self.assertEqual(first['Content-Type'], 'application/xml; charset=utf-8')
+        self.assertNotEqual(first['ETag'], json_response['ETag'])
+
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('menu-items'), {'format': 'xml'})
+        self.assertEqual(second.content, first.content)
+        self.assertIn('Accept', second['Vary'])
+
+
+@override_settings(
+    THROTTLE_STORE='LittleLemonAPI.throttling.InMemoryThrottleStore',
+    THROTTLE_RATES={
+        '*': {'anon': '1/min', 'customer': '3/min'},
+        'cart-summary-view': {'customer': '1/min'},
+    },
+)
+@shared_cache
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        get_throttle_store().clear()
+        self.customer = User.objects.create_user('customer')
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=self.customer).key}'}
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+
+    def test_requests_over_the_rate_are_shed_before_the_view(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('menu-items'), headers=self.headers).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('menu-item', args=[1]), headers=self.headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertIn('Request was throttled', response.json()['detail'])
+
+    def test_endpoints_with_their_own_rate_count_on_their_own(self):
+        self.assertEqual(self.client.get(reverse('cart-summary-view'), headers=self.headers).status_code, 200)
+        self.assertEqual(self.client.get(reverse('cart-summary-view'), headers=self.headers).status_code, 429)
+        self.assertEqual(self.client.get(reverse('menu-items'), headers=self.headers).status_code, 200)
+
+    def test_roles_without_a_rate_are_not_throttled(self):
+        headers = {'Authorization': f'Token {Token.objects.create(user=self.manager).key}'}
+
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('menu-items'), headers=headers).status_code, 200)
+
+    def test_anonymous_clients_are_counted_by_address(self):
+        self.assertEqual(self.client.get(reverse('menu-items')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('menu-items')).status_code, 429)
+        self.assertEqual(self.client.get(reverse('menu-items'), REMOTE_ADDR='10.0.0.2').status_code, 401)
+
+    def test_only_api_routes_are_throttled(self):
+        for _ in range(3):
+            self.assertNotEqual(self.client.post('/auth/token/login/', {}).status_code, 429)
+            self.assertNotEqual(self.client.get('/admin/login/').status_code, 429)
+        self.assertEqual(self.client.get(reverse('menu-items')).status_code, 401)
+
+    @override_settings(THROTTLE_NUM_PROXIES=1)
+    def test_clients_behind_a_proxy_are_counted_by_forwarded_address(self):
+        proxied = {'REMOTE_ADDR': '10.0.0.1'}
+        self.assertEqual(self.client.get(reverse('menu-items'), HTTP_X_FORWARDED_FOR='1.1.1.1', **proxied).status_code, 401)
+        self.assertEqual(self.client.get(reverse('menu-items'), HTTP_X_FORWARDED_FOR='2.2.2.2', **proxied).status_code, 401)
+        # Only the address added by the proxy counts, not the ones sent by the client.
+        spoofed = self.client.get(reverse('menu-items'), HTTP_X_FORWARDED_FOR='3.3.3.3, 1.1.1.1', **proxied)
+        self.assertEqual(spoofed.status_code, 429)
+
+    async def test_async_views_are_throttled(self):
+        for _ in range(3):
+            response = await self.async_client.get(reverse('orders-management-view'), headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+
+        response = await self.async_client.get(reverse('orders-management-view'), headers=self.headers)
+        self.assertEqual(response.status_code, 429)
+
+    def test_sliding_window_weighs_the_previous_window(self):
+        self.assertEqual(sliding_window_wait(previous=4, current=0, limit=4, window=60, now=30), 0)
+        self.assertEqual(sliding_window_wait(previous=4, current=2, limit=4, window=60, now=30), 0.001)
+        self.assertEqual(sliding_window_wait(previous=4, current=3, limit=4, window=60, now=15), 30)
+        self.assertEqual(sliding_window_wait(previous=0, current=4, limit=4, window=60, now=15), 45)
+
+    def test_cache_store_keeps_two_counters_per_key(self):
+        store = CacheThrottleStore()
+        with mock.patch('LittleLemonAPI.throttling.time.time', return_value=6000):
+            self.assertEqual([store.hit('key', 2, 60) for _ in range(3)], [0, 0, 60])
+        with mock.patch('LittleLemonAPI.throttling.time.time', return_value=6090):
+            self.assertEqual([store.hit('key', 2, 60) for _ in range(2)], [0, 0.001])
+        with mock.patch('LittleLemonAPI.throttling.time.time', return_value=6200):
+            self.assertEqual(store.hit('key', 2, 60), 0)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        for number in range(10):
+            MenuItem.objects.create(title=f'Main {number}', price=10, featured=False, category=category)
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_responses_above_the_threshold_are_gzipped(self):
+        plain = self.client.get(reverse('menu-items'))
+        response = self.client.get(reverse('menu-items'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+        not_modified = self.client.get(
+            reverse('menu-items'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_small_and_refused_responses_are_left_alone(self):
+        with self.settings(COMPRESSION_MIN_SIZE=1024 * 1024):
+            response = self.client.get(reverse('menu-items'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.client.get(reverse('menu-items'), HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(accepted_encodings('gzip;q=0, br;q=0.5, *'), {'br', '*'})
+
+    def test_streaming_responses_are_compressed_chunk_by_chunk(self):
+        plain = b''.join(self.client.get(reverse('orders-export-view')).streaming_content)
+        response = self.client.get(reverse('orders-export-view'), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_brotli_is_preferred_when_installed(self):
+        plain = self.client.get(reverse('menu-items'))
+        response = self.client.get(reverse('menu-items'), HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+
+class MenuImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        self.pasta = MenuItem.objects.create(title='Pasta', price='9.50', featured=False, category=self.mains)
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_rows_are_created_and_updated_in_bulk(self):
+        etag = self.client.get(reverse('menu-items'))['ETag']
+        rows = [{'title': f'Cake {number}', 'price': '4.00', 'category': 'desserts'} for number in range(50)]
+        rows.append({'title': 'Pasta', 'price': '11.00', 'featured': True, 'category': str(self.mains.pk)})
+
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse('menu-import-view'), rows, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (50, 1))
+        self.assertEqual(response.data['rows'][-1], {'row': 51, 'status': 'updated', 'id': self.pasta.pk})
+        self.pasta.refresh_from_db()
+        self.assertEqual((self.pasta.price, self.pasta.featured), (Decimal('11.00'), True))
+        self.assertEqual(MenuItem.objects.filter(category=self.desserts).count(), 50)
+        self.assertNotEqual(self.client.get(reverse('menu-items'))['ETag'], etag)
+
+    def test_an_invalid_row_aborts_the_import_unless_partial(self):
+        rows = [
+            {'title': 'Soup', 'price': '5.00', 'category': 'mains'},
+            {'title': 'Tea', 'price': 'free', 'category': 'mains'},
+            {'title': 'Pie', 'price': '3.00', 'category': 'starters'},
+            {'title': 'Soup', 'price': '6.00', 'category': 'mains'},
+        ]
+
+        response = self.client.post(reverse('menu-import-view'), {'items': rows}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([row['status'] for row in response.data['rows']], ['skipped', 'invalid', 'invalid', 'invalid'])
+        self.assertIn('price', response.data['rows'][1]['errors'])
+        self.assertFalse(MenuItem.objects.filter(title='Soup').exists())
+
+        response = self.client.post(reverse('menu-import-view') + '?partial=true', rows, format='json')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(MenuItem.objects.get(title='Soup').price, Decimal('5.00'))
+
+    def test_csv_body_and_command(self):
+        body = 'title,price,featured,category\nSalad,6.50,true,mains\n'
+
+        response = self.client.post(reverse('menu-import-view'), body, content_type='text/csv')
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(MenuItem.objects.get(title='Salad').featured)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as menu:
+            menu.write('id,title,price,category\n%d,Salad,7.00,mains\n' % MenuItem.objects.get(title='Salad').pk)
+        self.addCleanup(os.remove, menu.name)
+        output = StringIO()
+        call_command('import_menu', menu.name, stdout=output)
+
+        self.assertIn('1 updated', output.getvalue())
+        self.assertEqual(MenuItem.objects.get(title='Salad').price, Decimal('7.00'))
+        self.assertTrue(MenuItem.objects.get(title='Salad').featured)
+
+    def test_only_managers_can_import(self):
+        self.client.force_authenticate(User.objects.create_user('customer'))
+        self.assertEqual(self.client.post(reverse('menu-import-view'), [], format='json').status_code, 403)
+
+
+class MenuItemsPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        mains = Category.objects.create(slug='mains', title='Mains')
+        desserts = Category.objects.create(slug='desserts', title='Desserts')
+        for number in range(5):
+            MenuItem.objects.create(title=f'Main {number}', price=10 + number, featured=number % 2 == 0, category=mains)
+            MenuItem.objects.create(title=f'Dessert {number}', price=5, featured=False, category=desserts)
+        self.desserts = desserts
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('customer'))
+
+    def collect_titles(self, params):
+        titles = []
+        url = reverse('menu-items')
+        while url:
+            page = self.client.get(url, params).json()
+            titles += [item['title'] for item in page['results']]
+            url, params = page['next'], None
+        return titles
+
+    def test_pages_cover_every_item_once_in_order(self):
+        titles = self.collect_titles({'ordering': '-price', 'perpage': 3})
+
+        expected = MenuItem.objects.order_by('-price', '-id').values_list('title', flat=True)
+        self.assertEqual(titles, list(expected))
+
+    def test_filters(self):
+        titles = self.collect_titles({'category': self.desserts.pk})
+        self.assertEqual(len(titles), 5)
+
+        titles = self.collect_titles({'featured': 'true', 'min_price': '11', 'max_price': '13'})
+        self.assertEqual(titles, ['Main 2'])
+
+    def test_invalid_parameters_are_rejected(self):
+        response = self.client.get(reverse('menu-items'), {'ordering': 'category'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('menu-items'), {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+
+
+@shared_cache
+class OrderFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.menu = [
+            MenuItem.objects.create(title=f'Main {number}', price=10, featured=False, category=category)
+            for number in range(3)
+        ]
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+        self.crew = User.objects.create_user('crew')
+        Group.objects.create(name=DELIVERY_CREW).user_set.add(self.crew)
+        self.customer = User.objects.create_user('customer')
+        self.other_customer = User.objects.create_user('other')
+
+    def create_orders(self, user, count, delivery_crew=None):
+        for number in range(count):
+            order = Order.objects.create(
+                user=user, delivery_crew=delivery_crew, total=30, date=datetime.date(2023, 5, number + 1))
+            for item in self.menu:
+                OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=10, price=10)
+
+    def get_feed(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(reverse('orders-management-view'), params)
+
+    def test_large_feeds_are_streamed(self):
+        self.create_orders(self.customer, 5)
+        documents = {}
+        for format in ('json', 'xml'):
+            documents[format] = self.get_feed(self.manager, format=format).content
+
+            with mock.patch('LittleLemonAPI.renderers.STREAM_MIN_ROWS', 2), \
+                    mock.patch('LittleLemonAPI.renderers.STREAM_CHUNK_ROWS', 2):
+                response = self.get_feed(self.manager, format=format)
+            self.assertTrue(response.streaming)
+            self.assertEqual(b''.join(response.streaming_content), documents[format])
+
+        self.assertEqual(len(json.loads(documents['json'])), 5)
+        self.assertEqual(documents['xml'].count(b'<menuitem>'), 15)
+
+    async def test_large_feeds_are_streamed_asynchronously_under_asgi(self):
+        await sync_to_async(self.create_orders)(self.customer, 5)
+        token = await Token.objects.acreate(user=self.manager)
+
+        with mock.patch('LittleLemonAPI.renderers.STREAM_MIN_ROWS', 2), \
+                mock.patch('LittleLemonAPI.renderers.STREAM_CHUNK_ROWS', 2), \
+                warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            response = await self.async_client.get(
+                reverse('orders-management-view'), {'format': 'xml'}, headers={'Authorization': f'Token {token.key}'})
+            content = b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(content.count(b'<menuitem>'), 15)
+        self.assertFalse([warning for warning in caught if 'synchronous iterators' in str(warning.message)])
+
+    def test_orders_are_grouped_with_their_items(self):
+        self.create_orders(self.customer, 2, delivery_crew=self.crew)
+        self.create_orders(self.other_customer, 1)
+
+        orders = self.get_feed(self.customer).json()
+
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(orders[0]['date'], '2023-05-02')
+        self.assertEqual(orders[0]['user'], self.customer.pk)
+        self.assertEqual(orders[0]['delivery_crew'], self.crew.pk)
+        self.assertEqual([item['menuitem'] for item in orders[0]['items']], [item.pk for item in self.menu])
+
+    def test_role_feeds(self):
+        self.create_orders(self.customer, 2, delivery_crew=self.crew)
+        self.create_orders(self.other_customer, 1)
+
+        self.assertEqual(len(self.get_feed(self.crew).json()), 2)
+        self.assertEqual(len(self.get_feed(self.manager).json()), 3)
+        self.assertEqual(len(self.get_feed(self.other_customer).json()), 1)
+
+    def test_query_count_does_not_depend_on_feed_size(self):
+        for user in (self.customer, self.crew, self.manager):
+            self.get_feed(user)
+
+        self.create_orders(self.customer, 10, delivery_crew=self.crew)
+        for user in User.objects.filter(pk__in=[self.customer.pk, self.crew.pk, self.manager.pk]):
+            with self.subTest(user=user.username), self.assertNumQueries(2):
+                self.get_feed(user)
+
+
+class DeliveryQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.crew = User.objects.create_user('crew')
+        self.other_crew = User.objects.create_user('other crew')
+        Group.objects.create(name=DELIVERY_CREW).user_set.add(self.crew, self.other_crew)
+        self.customer = User.objects.create_user('customer')
+        self.orders = [
+            Order.objects.create(user=self.customer, total=10, date=datetime.date(2023, 5, day)) for day in (2, 1, 3)
+        ]
+        Order.objects.create(user=self.customer, total=10, date=datetime.date(2023, 4, 1), status=True)
+        Order.objects.create(user=self.customer, delivery_crew=self.other_crew, total=10, date=datetime.date(2023, 4, 2))
+
+    def claim(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(reverse('delivery-queue-view') + ('?wait=%d' % params['wait'] if params else ''))
+
+    def test_claims_hand_out_the_oldest_orders_once(self):
+        claimed = [self.claim(user).data['id'] for user in (self.crew, self.other_crew, self.crew)]
+
+        self.assertEqual(claimed, [self.orders[1].pk, self.orders[0].pk, self.orders[2].pk])
+        self.assertEqual(Order.objects.get(pk=claimed[1]).delivery_crew, self.other_crew)
+        self.assertEqual(self.claim(self.crew).status_code, 204)
+
+    def test_an_order_claimed_by_someone_else_is_skipped(self):
+        taken = self.orders[1]
+        original_update = QuerySet.update
+
+        def steal_first(queryset, **values):
+            if not Order.objects.filter(delivery_crew=self.other_crew, pk=taken.pk).exists():
+                original_update(Order.objects.filter(pk=taken.pk), delivery_crew=self.other_crew)
+            return original_update(queryset, **values)
+
+        with mock.patch.object(QuerySet, 'update', steal_first):
+            order = claim_next_order(self.crew)
+
+        self.assertEqual(order.pk, self.orders[0].pk)
+
+    async def test_long_poll_waits_for_an_order(self):
+        await Order.objects.filter(delivery_crew=None).aupdate(status=True)
+        token = await Token.objects.acreate(user=self.crew)
+        headers = {'Authorization': f'Token {token.key}'}
+
+        async def sleep(seconds):
+            await Order.objects.filter(pk=self.orders[2].pk).aupdate(status=False)
+
+        with mock.patch('LittleLemonAPI.delivery.QUEUE_POLL_INTERVAL', 0.01), \
+                mock.patch('LittleLemonAPI.delivery.asyncio.sleep', sleep):
+            response = await self.async_client.post(reverse('delivery-queue-view') + '?wait=1', headers=headers)
+
+        self.assertEqual(response.json()['id'], self.orders[2].pk)
+        response = await self.async_client.post(reverse('delivery-queue-view') + '?wait=0', headers=headers)
+        self.assertEqual(response.status_code, 204)
+
+    def test_claims_do_not_wait_under_wsgi(self):
+        Order.objects.filter(delivery_crew=None).update(status=True)
+        headers = {'Authorization': f'Token {Token.objects.create(user=self.crew).key}'}
+
+        with mock.patch('LittleLemonAPI.delivery.asyncio.sleep') as sleep:
+            response = self.client.post(reverse('delivery-queue-view') + '?wait=25', headers=headers)
+
+        self.assertEqual(response.status_code, 204)
+        sleep.assert_not_called()
+
+    def test_only_delivery_crew_can_claim(self):
+        self.assertEqual(self.claim(self.customer).status_code, 403)
+        self.assertEqual(self.claim(self.crew, wait=60).status_code, 400)
+
+    async def test_claims_are_served_natively(self):
+        token = await Token.objects.acreate(user=self.crew)
+
+        response = await self.async_client.post(
+            reverse('delivery-queue-view'), headers={'Authorization': f'Token {token.key}'})
+
+        self.assertEqual(response.json()['id'], self.orders[1].pk)
+        self.assertEqual(response.json()['delivery_crew'], self.crew.pk)
+
+
+class OrderEventsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user('customer')
+        self.crew = User.objects.create_user('crew')
+        Group.objects.create(name=DELIVERY_CREW).user_set.add(self.crew)
+        self.order = Order.objects.create(user=self.customer, total=10, date=datetime.date(2023, 5, 1))
+
+    def test_order_changes_are_published_after_commit(self):
+        client = APIClient()
+        client.force_authenticate(self.crew)
+        Order.objects.filter(pk=self.order.pk).update(delivery_crew=self.crew)
+
+        with mock.patch('LittleLemonAPI.events.get_broker') as get_broker, \
+                self.captureOnCommitCallbacks(execute=True):
+            client.patch(reverse('order-view', args=[self.order.pk]), {'status': '1'})
+
+        published = {channel: message for (channel, message), _ in get_broker().publish.call_args_list}
+        expected = {'id': self.order.pk, 'status': True, 'delivery_crew': self.crew.pk}
+        self.assertEqual(published, {
+            user_channel(self.customer.pk): expected,
+            user_channel(self.crew.pk): expected,
+            MANAGERS_CHANNEL: expected,
+        })
+
+    async def test_stream_pushes_the_events_of_the_user(self):
+        token = await Token.objects.acreate(user=self.customer)
+        response = await self.async_client.get(
+            reverse('order-events-view'), headers={'Authorization': f'Token {token.key}'})
+        events = aiter(response.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+
+        get_broker().publish(user_channel(self.crew.pk), {'id': 0})
+        get_broker().publish(user_channel(self.customer.pk), {'id': self.order.pk, 'status': True})
+        self.assertEqual(
+            await anext(events), b'id: 1\nevent: order\ndata: {"id": %d, "status": true}\n\n' % self.order.pk)
+
+        # A client disconnect cancels the pending read, which ends the subscription.
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertFalse(get_broker().subscriptions)
+
+    async def test_stream_requires_authentication(self):
+        response = await self.async_client.get(reverse('order-events-view'))
+        self.assertEqual(response.status_code, 401)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.menu = [
+            MenuItem.objects.create(title=f'Main {number}', price=10, featured=False, category=category)
+            for number in range(2)
+        ]
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+        self.customer = User.objects.create_user('customer')
+        for day in range(1, 4):
+            order = Order.objects.create(user=self.customer, total=20, date=datetime.date(2023, 5, day))
+            for item in self.menu:
+                OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=10, price=10)
+        self.empty_order = Order.objects.create(user=self.customer, total=0, date=datetime.date(2023, 5, 4))
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def export(self, **params):
+        response = self.client.get(reverse('orders-export-view'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_lines_match_the_order_feed(self):
+        with mock.patch('LittleLemonAPI.exports.EXPORT_CHUNK_SIZE', 2):
+            response, content = self.export(start_date='2023-05-02')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        feed = sorted(self.client.get(reverse('orders-management-view')).json(), key=lambda order: order['date'])
+        self.assertEqual([json.loads(line) for line in content.splitlines()], feed[1:])
+
+    def test_csv_has_one_line_per_item(self):
+        with mock.patch('LittleLemonAPI.exports.EXPORT_CHUNK_SIZE', 2):
+            response, content = self.export(type='csv', end_date='2023-05-04')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = list(csv.reader(StringIO(content)))
+        self.assertEqual(lines[0][:2], ['order_id', 'user'])
+        self.assertEqual(len(lines), 1 + 3 * 2 + 1)
+        self.assertEqual(lines[-1][0], str(self.empty_order.pk))
+        self.assertEqual(lines[-1][6:], [''] * 5)
+        self.assertEqual(lines[1][4], '20.00')
+
+    async def test_export_is_streamed_asynchronously_under_asgi(self):
+        token = await Token.objects.acreate(user=self.manager)
+
+        with mock.patch('LittleLemonAPI.exports.EXPORT_CHUNK_SIZE', 2), warnings.catch_warnings():
+            # Django warns when it has to read a sync iterator to the end to serve it under ASGI.
+            warnings.simplefilter('error')
+            response = await self.async_client.get(
+                reverse('orders-export-view'), {'type': 'csv'}, headers={'Authorization': f'Token {token.key}'})
+            chunks = [chunk async for chunk in response]
+
+        self.assertTrue(response.is_async)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(len(list(csv.reader(StringIO(b''.join(chunks).decode())))), 1 + 3 * 2 + 1)
+
+    def test_only_managers_can_export(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(reverse('orders-export-view')).status_code, 403)
+
+    def test_invalid_ranges_are_rejected(self):
+        response = self.client.get(reverse('orders-export-view'), {'start_date': '2023-05-03', 'end_date': '2023-05-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.menu = [
+            MenuItem.objects.create(title=f'Main {number}', price=10 + number, featured=False, category=category)
+            for number in range(10)
+        ]
+        self.customer = User.objects.create_user('customer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def fill_cart(self, count):
+        for item in self.menu[:count]:
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2)
+
+    def test_checkout_turns_the_cart_into_an_order(self):
+        self.fill_cart(3)
+
+        response = self.client.post(reverse('orders-management-view'))
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(response.data['id'], order.pk)
+        self.assertEqual(order.total, 66)
+        self.assertEqual(order.orderitem_set.count(), 3)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_repeated_checkout_finds_an_empty_cart(self):
+        self.fill_cart(1)
+        self.client.post(reverse('orders-management-view'))
+
+        response = self.client.post(reverse('orders-management-view'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_retried_checkout_replays_the_first_order(self):
+        self.fill_cart(3)
+        url = reverse('orders-management-view')
+
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.fill_cart(1)
+        with self.assertNumQueries(0):
+            retry = self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Cart.objects.count(), 1)
+
+        self.assertEqual(self.client.post(url, {'note': 'other'}, HTTP_IDEMPOTENCY_KEY='checkout-1').status_code, 422)
+        self.assertEqual(self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout-2').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_idempotency_keys_are_scoped_to_the_user(self):
+        self.fill_cart(1)
+        url = reverse('orders-management-view')
+        self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout')
+
+        other = User.objects.create_user('other')
+        Cart.objects.create(user=other, menuitem=self.menu[0], quantity=1, unit_price=10, price=10)
+        self.client.force_authenticate(other)
+        response = self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user'], other.pk)
+
+    def test_retry_while_the_first_request_runs_conflicts(self):
+        self.fill_cart(1)
+        url = reverse('orders-management-view')
+        responses = []
+
+        def retry(user):
+            responses.append(self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout'))
+            return None
+
+        with mock.patch('LittleLemonAPI.views.place_order', side_effect=retry):
+            self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout')
+
+        self.assertEqual(responses[0].status_code, 409)
+
+    @override_settings(REQUEST_TIMEOUT=120)
+    def test_slow_requests_keep_their_key_locked(self):
+        self.fill_cart(1)
+        url = reverse('orders-management-view')
+        responses = []
+        later = time.time() + 100
+
+        def slow_retry(user):
+            with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+                responses.append(self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout'))
+            return None
+
+        with mock.patch('LittleLemonAPI.views.place_order', side_effect=slow_retry):
+            self.client.post(url, HTTP_IDEMPOTENCY_KEY='checkout')
+
+        self.assertEqual(responses[0].status_code, 409)
+
+    def test_carts_too_large_for_an_order_are_rejected(self):
+        MenuItem.objects.filter(pk__in=[self.menu[0].pk, self.menu[1].pk]).update(price=900)
+        url = reverse('cart-management-view')
+        self.assertEqual(self.client.post(url, {'menuitem': self.menu[0].pk, 'quantity': 10}).status_code, 201)
+
+        response = self.client.post(url, {'menuitem': self.menu[1].pk, 'quantity': 10})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Cart.objects.count(), 1)
+        self.assertEqual(self.client.get(reverse('cart-summary-view')).json()['subtotal'], '9000.00')
+
+        # Carts filled before the limit existed.
+        Cart.objects.create(user=self.customer, menuitem=self.menu[1], quantity=10, unit_price=900, price=9000)
+        response = self.client.post(reverse('orders-management-view'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.count(), 2)
+        self.assertEqual(self.client.get(reverse('orders-management-view')).status_code, 200)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        self.fill_cart(1)
+        self.client.post(reverse('orders-management-view'))
+        self.fill_cart(10)
+
+        with self.assertNumQueries(11):
+            self.client.post(reverse('orders-management-view'))
+
+    def test_items_keep_the_prices_of_the_cart(self):
+        self.client.post(reverse('cart-management-view'), [
+            {'menuitem': self.menu[0].pk, 'quantity': 2},
+            {'menuitem': self.menu[1].pk, 'quantity': 2},
+        ], format='json')
+        MenuItem.objects.filter(pk=self.menu[0].pk).update(price=9000)
+
+        self.client.post(reverse('orders-management-view'))
+        MenuItem.objects.filter(pk=self.menu[1].pk).update(price=30)
+
+        order = Order.objects.get()
+        self.assertEqual(order.total, 42)
+        self.assertEqual(sorted(order.orderitem_set.values_list('unit_price', 'price')), [(10, 20), (11, 22)])
+        response = self.client.get(reverse('orders-management-view'))
+        self.assertEqual(sorted(item['price'] for item in response.json()[0]['items']), ['20.00', '22.00'])
+
+        manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(manager)
+        self.client.force_authenticate(manager)
+        response = self.client.get(reverse('order-view', args=[order.pk]))
+        self.assertEqual(sorted((item['unit_price'], item['price']) for item in response.json()),
+                         [('10.00', '20.00'), ('11.00', '22.00')])
+        self.assertEqual(self.client.get(reverse('order-view', args=[404])).status_code, 404)
+
+    def test_totals_are_verified_against_the_items(self):
+        self.fill_cart(3)
+        self.client.post(reverse('orders-management-view'))
+        self.fill_cart(1)
+        self.client.post(reverse('orders-management-view'))
+        call_command('verify_order_totals', stdout=StringIO())
+
+        wrong = Order.objects.order_by('id').last()
+        Order.objects.filter(pk=wrong.pk).update(total=5)
+        output = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 orders'):
+            call_command('verify_order_totals', start_date=wrong.date.isoformat(), stdout=output)
+        self.assertIn(f'Order {wrong.pk} of {wrong.date}: total 5.00, items 20.00.', output.getvalue())
+
+        yesterday = wrong.date - datetime.timedelta(days=1)
+        call_command('verify_order_totals', end_date=yesterday.isoformat(), stdout=StringIO())
+
+
+class OrderArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.menu = [
+            MenuItem.objects.create(title=f'Main {number}', price=10, featured=False, category=category)
+            for number in range(2)
+        ]
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+        self.crew = User.objects.create_user('crew')
+        Group.objects.create(name=DELIVERY_CREW).user_set.add(self.crew)
+        self.customer = User.objects.create_user('customer')
+
+        today = datetime.date.today()
+        for days, delivered in ((800, True), (700, True), (600, True), (500, False), (10, True), (400, True)):
+            order = Order.objects.create(user=self.customer, delivery_crew=self.crew, status=delivered, total=20,
+                                         date=today - datetime.timedelta(days=days))
+            for item in self.menu[:1 if days == 700 else 2]:
+                OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=10, price=10)
+        rebuild_sales()
+        self.client = APIClient()
+
+    def history(self):
+        responses = {}
+        for user in (self.manager, self.crew, self.customer):
+            self.client.force_authenticate(user)
+            responses[user.username] = self.client.get(reverse('orders-management-view')).content
+        self.client.force_authenticate(self.manager)
+        responses['export'] = b''.join(self.client.get(reverse('orders-export-view')).streaming_content)
+        responses['csv'] = b''.join(self.client.get(reverse('orders-export-view'), {'type': 'csv'}).streaming_content)
+        return responses
+
+    def test_old_delivered_orders_move_to_the_archive_in_batches(self):
+        old_ids = list(Order.objects.filter(status=True, date__lt=datetime.date.today() - datetime.timedelta(days=365))
+                       .values_list('id', flat=True))
+        rollups = sorted(DailySales.objects.values_list('date', 'menuitem', 'units', 'revenue'))
+        output = StringIO()
+
+        call_command('archive_orders', batch_size=2, stdout=output)
+
+        self.assertIn('Archived 4 orders', output.getvalue())
+        self.assertCountEqual(ArchivedOrder.objects.values_list('id', flat=True), old_ids)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 7)
+        self.assertEqual(list(Order.objects.values_list('status', flat=True).order_by('date')), [False, True])
+        self.assertFalse(OrderItem.objects.filter(order_id__in=old_ids).exists())
+        self.assertEqual(sorted(DailySales.objects.values_list('date', 'menuitem', 'units', 'revenue')), rollups)
+
+        rebuild_sales()
+        self.assertEqual(sorted(DailySales.objects.values_list('date', 'menuitem', 'units', 'revenue')), rollups)
+
+    @skipUnless(connection.vendor == 'postgresql', 'The archive is only partitioned on PostgreSQL.')
+    @override_settings(ORDER_ARCHIVE_PARTITIONED=True)
+    def test_partitioned_archive_keeps_its_indexes(self):
+        migration = importlib.import_module('LittleLemonAPI.migrations.0006_order_archive')
+        with connection.schema_editor() as schema_editor:
+            migration.partition_archive(apps, schema_editor)
+
+        table = ArchivedOrder._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s', [table])
+            self.assertEqual(cursor.fetchone()[0], 'p')
+            constraints = connection.introspection.get_constraints(cursor, table).values()
+        indexed = {tuple(constraint['columns']) for constraint in constraints if constraint['index']}
+        self.assertLessEqual({('date',), ('user_id', 'date'), ('delivery_crew_id', 'date')}, indexed)
+        self.assertIn(['id', 'date'], [constraint['columns'] for constraint in constraints if constraint['primary_key']])
+
+        call_command('archive_orders', stdout=StringIO())
+        self.assertEqual(ArchivedOrder.objects.count(), 4)
+
+    def test_history_reads_the_archive_transparently(self):
+        before = self.history()
+        archived_id = Order.objects.order_by('date').first().pk
+
+        call_command('archive_orders', days=30, stdout=StringIO())
+
+        self.assertEqual(self.history(), before)
+        self.assertEqual(Order.objects.count(), 2)
+
+        self.client.force_authenticate(self.manager)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('orders-management-view'))
+        self.assertEqual(len(response.json()), 6)
+
+        response = self.client.get(reverse('order-view', args=[archived_id]))
+        self.assertEqual([item['menuitem'] for item in response.json()], [item.pk for item in self.menu])
+        self.assertEqual({item['price'] for item in response.json()}, {'10.00'})
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        mains = Category.objects.create(slug='mains', title='Mains')
+        desserts = Category.objects.create(slug='desserts', title='Desserts')
+        self.pasta = MenuItem.objects.create(title='Pasta', price='9.50', featured=False, category=mains)
+        self.cake = MenuItem.objects.create(title='Cake', price='4.00', featured=False, category=desserts)
+        self.customer = User.objects.create_user('customer')
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+        self.client = APIClient()
+
+    def checkout(self, *lines):
+        self.client.force_authenticate(self.customer)
+        for menuitem, quantity in lines:
+            self.client.post(reverse('cart-management-view'), {'menuitem': menuitem.pk, 'quantity': quantity})
+        return self.client.post(reverse('orders-management-view')).data['id']
+
+    def report(self, **params):
+        self.client.force_authenticate(self.manager)
+        return self.client.get(reverse('sales-report-view'), params).json()
+
+    def rollups(self):
+        return sorted(DailySales.objects.exclude(units=0).values_list('date', 'menuitem', 'units', 'revenue'))
+
+    def test_checkout_updates_the_rollups(self):
+        self.checkout((self.pasta, 2), (self.cake, 1))
+        self.checkout((self.pasta, 1))
+
+        self.assertEqual(self.report(), [
+            {'menuitem': self.pasta.pk, 'units': 3, 'revenue': '28.50'},
+            {'menuitem': self.cake.pk, 'units': 1, 'revenue': '4.00'},
+        ])
+        self.assertEqual(
+            [row['category'] for row in self.report(group='category', per_day='true')],
+            [self.pasta.category_id, self.cake.category_id],
+        )
+
+    def test_date_changes_and_deletes_move_the_rollups(self):
+        order_id = self.checkout((self.pasta, 2))
+        self.checkout((self.cake, 1))
+        self.client.force_authenticate(self.manager)
+
+        self.client.put(reverse('order-view', args=[order_id]), {
+            'user': self.customer.pk, 'delivery_crew': None, 'status': False, 'total': '19.00', 'date': '2023-05-01',
+        }, format='json')
+        self.assertEqual(self.report(end_date='2023-05-31'), [{'menuitem': self.pasta.pk, 'units': 2, 'revenue': '19.00'}])
+
+        self.client.delete(reverse('order-view', args=[order_id]))
+        self.assertEqual(self.report(end_date='2023-05-31'), [])
+        self.assertEqual(len(self.report()), 1)
+
+    def test_rebuild_matches_the_incremental_rollups(self):
+        self.checkout((self.pasta, 2), (self.cake, 1))
+        self.checkout((self.cake, 3))
+        incremental = self.rollups()
+
+        call_command('rebuild_sales', stdout=StringIO())
+
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_only_managers_see_the_report(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(reverse('sales-report-view')).status_code, 403)
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(title='Pasta', price='9.50', featured=False, category=category)
+        self.salad = MenuItem.objects.create(title='Salad', price='6.00', featured=False, category=category)
+        self.customer = User.objects.create_user('customer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_batch_is_upserted_with_menu_prices(self):
+        self.client.post(reverse('cart-management-view'), {'menuitem': self.pasta.pk, 'quantity': 1})
+
+        response = self.client.post(reverse('cart-management-view'), {'items': [
+            {'menuitem': self.pasta.pk, 'quantity': 3},
+            {'menuitem': self.salad.pk, 'quantity': 2},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        lines = {line['menuitem']: line for line in response.json()}
+        self.assertEqual(lines[self.pasta.pk]['quantity'], 3)
+        self.assertEqual(lines[self.pasta.pk]['price'], '28.50')
+        self.assertEqual(lines[self.salad.pk]['unit_price'], '6.00')
+        self.assertEqual(Cart.objects.count(), 2)
+
+    def test_unknown_menu_items_are_rejected(self):
+        response = self.client.post(reverse('cart-management-view'), [
+            {'menuitem': self.pasta.pk, 'quantity': 1},
+            {'menuitem': 404, 'quantity': 1},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_cart_is_listed_and_cleared(self):
+        self.client.post(reverse('cart-management-view'), [
+            {'menuitem': self.pasta.pk, 'quantity': 1},
+            {'menuitem': self.salad.pk, 'quantity': 1},
+        ], format='json')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart-management-view'))
+        self.assertEqual(len(response.json()), 2)
+
+        self.client.delete(reverse('cart-management-view'))
+        self.assertFalse(Cart.objects.exists())
+
+    def test_summary_follows_cart_writes(self):
+        url = reverse('cart-summary-view')
+        self.assertEqual(self.client.get(url).json()['item_count'], 0)
+
+        self.client.post(reverse('cart-management-view'), [
+            {'menuitem': self.pasta.pk, 'quantity': 2},
+            {'menuitem': self.salad.pk, 'quantity': 1},
+        ], format='json')
+        self.client.post(reverse('cart-management-view'), {'menuitem': self.pasta.pk, 'quantity': 1})
+
+        with self.assertNumQueries(1):
+            summary = self.client.get(url).json()
+        self.assertEqual(summary['item_count'], 2)
+        self.assertEqual(summary['subtotal'], '15.50')
+
+        self.client.delete(reverse('cart-management-view'))
+        summary = self.client.get(url).json()
+        self.assertEqual(summary['item_count'], 0)
+        self.assertEqual(summary['subtotal'], '0.00')
+
+    def test_deleted_menu_items_leave_the_summaries(self):
+        other = User.objects.create_user('other')
+        self.client.post(reverse('cart-management-view'), [
+            {'menuitem': self.pasta.pk, 'quantity': 2},
+            {'menuitem': self.salad.pk, 'quantity': 1},
+        ], format='json')
+        self.client.force_authenticate(other)
+        self.client.post(reverse('cart-management-view'), {'menuitem': self.pasta.pk, 'quantity': 1})
+
+        manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(manager)
+        self.client.force_authenticate(manager)
+        self.assertEqual(self.client.delete(reverse('menu-item', args=[self.pasta.pk])).status_code, 200)
+
+        summaries = dict(CartSummary.objects.values_list('user__username', 'subtotal'))
+        self.assertEqual(summaries, {'customer': Decimal('6.00'), 'other': Decimal('0.00')})
+        self.assertEqual(CartSummary.objects.get(user=other).item_count, 0)
+
+    def test_carts_without_a_summary_are_summed_in_full(self):
+        Cart.objects.create(user=self.customer, menuitem=self.salad, quantity=2, unit_price='6.00', price='12.00')
+
+        self.client.post(reverse('cart-management-view'), {'menuitem': self.pasta.pk, 'quantity': 1})
+
+        summary = self.client.get(reverse('cart-summary-view')).json()
+        self.assertEqual(summary['item_count'], 3)
+        self.assertEqual(summary['subtotal'], '21.50')
+
+        other = User.objects.create_user('other')
+        Cart.objects.create(user=other, menuitem=self.pasta, quantity=1, unit_price='9.50', price='9.50')
+        summarize_carts()
+        self.assertEqual(CartSummary.objects.get(user=other).subtotal, Decimal('9.50'))
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_every_endpoint_stays_within_its_query_budget(self):
+        output = StringIO()
+
+        call_command('benchmark', users=40, menu_items=20, orders=60, requests=300, stdout=output)
+
+        self.assertIn('orders-management-view', output.getvalue())
+        self.assertFalse(User.objects.exists())
+
+    def test_asgi_transport(self):
+        output = StringIO()
+
+        call_command('benchmark', users=40, menu_items=20, orders=60, requests=100, transport='asgi', stdout=output)
+
+        self.assertIn('asgi:', output.getvalue())
+
+    def test_serializer_benchmark(self):
+        output = StringIO()
+
+        call_command('benchmark_serializers', rows=50, repeat=1, stdout=output)
+
+        self.assertIn('orders-management-view', output.getvalue())
+        self.assertFalse(MenuItem.objects.exists())
+
+    def test_renderer_benchmark(self):
+        output = StringIO()
+
+        call_command('benchmark_renderers', rows=50, repeat=1, stdout=output)
+
+        self.assertIn('gzip KB', output.getvalue())
+        self.assertEqual(output.getvalue().count('orders-management-view'), 6)
+        self.assertFalse(MenuItem.objects.exists())
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        titles = ['Plain', 'Caf\u00e9 \u2603 \U0001f600', 'Line\u2028separator\u2029', 'Quote " back \\ slash', 'Tab\t\x00\x1f\x7f']
+        self.menu = [
+            MenuItem.objects.create(title=title, price=price, featured=number % 2 == 0, category=category)
+            for number, (title, price) in enumerate(zip(titles, ['0.5', '12', '9999.99', '3.10', '0']))
+        ]
+        self.manager = User.objects.create_user('manager')
+        Group.objects.create(name=MANAGER).user_set.add(self.manager)
+        self.customer = User.objects.create_user('customer')
+        for number in range(3):
+            order = Order.objects.create(
+                user=self.customer, delivery_crew=self.manager if number else None, status=number == 2,
+                total='30.05', date=datetime.date(2023, 5, number + 1))
+            for item in self.menu[number:]:
+                OrderItem.objects.create(order=order, menuitem=item, quantity=2, unit_price=item.price, price=item.price)
+        Order.objects.create(user=self.customer, total=0, date=datetime.date(2023, 6, 1))
+
+    def test_menu_items_match_the_serializer(self):
+        items = MenuItem.objects.order_by('id')
+
+        self.assertEqual(
+            dumps(menu_item_rows.data(items)),
+            JSONRenderer().render(MenuItemSerializer(items, many=True).data),
+        )
+
+    def test_order_feed_matches_the_serializer(self):
+        manager = User.objects.get(pk=self.manager.pk)
+        orders = order_feed(manager).prefetch_related('orderitem_set')
+
+        with self.assertNumQueries(2):
+            data = order_feed_data(manager)
+
+        self.assertEqual(dumps(data), JSONRenderer().render(OrderFeedSerializer(orders, many=True).data))
+
+    def test_xml_matches_rest_framework_xml(self):
+        manager = User.objects.get(pk=self.manager.pk)
+        for data in (menu_item_rows.data(MenuItem.objects.exclude(pk=self.menu[-1].pk)), order_feed_data(manager)):
+            document = XMLRenderer().render(data)
+
+            self.assertEqual(FastXMLRenderer().render(data), document)
+            self.assertEqual(''.join(FastXMLRenderer().stream(data, chunk_rows=2)), document)
+
+        with self.assertRaises(UnserializableContentError):
+            FastXMLRenderer().render(menu_item_rows.data(MenuItem.objects.all()))
+
+    def test_streamed_json_matches_dumps(self):
+        data = menu_item_rows.data(MenuItem.objects.order_by('id'))
+
+        for chunk_rows in (1, 2, 100):
+            self.assertEqual(b''.join(stream_json(data, chunk_rows)), dumps(data))
+        self.assertEqual(b''.join(stream_json([])), b'[]')
+
+    def test_unknown_types_fall_back_to_the_renderer(self):
+        data = {'price': MenuItem.objects.first().price, 'date': datetime.datetime(2023, 5, 1, 12, 30)}
+
+        self.assertEqual(dumps(data), JSONRenderer().render(data))
+
+
+class QueryPlanTests(TestCase):
+    def test_every_view_query_uses_its_index(self):
+        for name, index, plan in query_plans():
+            with self.subTest(name):
+                self.assertIn(index, plan)
+
+    def test_query_plans_command(self):
+        output = StringIO()
+
+        call_command('query_plans', stdout=output)
+
+        self.assertIn('order_undelivered_idx', output.getvalue())
+        self.assertNotIn('NOT USED', output.getvalue())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.client = APIClient()
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.force_authenticate(User.objects.create_user('customer'))
+        self.client.get(reverse('cart-management-view'))
+        self.client.get(reverse('cart-management-view'))
+
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        exposition = response.content.decode()
+        self.assertIn('littlelemon_request_duration_seconds_count{view="cart-management-view"} 2', exposition)
+        self.assertIn('littlelemon_db_queries_bucket{view="cart-management-view",le="+Inf"} 2', exposition)
+
+    def test_metrics_are_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user('customer'))
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        self.client.force_authenticate(User.objects.create_user('customer'))
+
+        with self.assertLogs('LittleLemonAPI.middleware', 'WARNING') as logs:
+            self.client.get(reverse('cart-management-view'))
+
+        self.assertIn('LittleLemonAPI_cart', logs.output[0])
+
+
+@mock.patch('LittleLemonAPI.routers.replica_aliases', return_value=['replica_1'])
+class PrimaryReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.router.replicas = ['replica_1']
+        self.customer = User.objects.create_user('customer')
+
+    def test_only_replica_blocks_read_from_replicas(self, replica_aliases):
+        self.assertEqual(self.router.db_for_read(MenuItem), 'default')
+        with primary_pinning(), replica_reads(AnonymousUser()):
+            self.assertEqual(self.router.db_for_read(MenuItem), 'replica_1')
+
+    def test_reads_after_a_write_stay_on_the_primary(self, replica_aliases):
+        with primary_pinning(), replica_reads(self.customer):
+            self.assertEqual(self.router.db_for_write(Cart), 'default')
+            self.assertEqual(self.router.db_for_read(Cart), 'default')
+
+    def test_users_who_just_wrote_read_from_the_primary(self, replica_aliases):
+        pin_user_to_primary(self.customer)
+
+        with primary_pinning(), replica_reads(self.customer):
+            self.assertEqual(self.router.db_for_read(Cart), 'default')
+
+    async def test_async_blocks_read_the_pin_without_blocking(self, replica_aliases):
+        pins = mock.Mock(get=mock.Mock(side_effect=AssertionError('blocking cache read')), aget=mock.AsyncMock())
+
+        with mock.patch('LittleLemonAPI.routers.cache', pins), primary_pinning():
+            pins.aget.return_value = True
+            async with areplica_reads(self.customer):
+                self.assertEqual(self.router.db_for_read(Cart), 'default')
+            pins.aget.return_value = None
+            async with areplica_reads(self.customer):
+                self.assertEqual(self.router.db_for_read(Cart), 'replica_1')
+
+        pins.aget.assert_awaited_with(f'db-pin:{self.customer.pk}')
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(title='Pasta', price='9.50', featured=False, category=category)
+        customer = User.objects.create_user('customer')
+        Order.objects.create(user=customer, total='9.50', date=datetime.date(2023, 5, 1))
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=customer).key}'}
+
+    async def test_menu_items_are_served_natively(self):
+        response = await self.async_client.get(reverse('menu-items'), headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['title'], 'Pasta')
+        self.assertIn('ETag', response)
+
+    async def test_menu_item_is_served_natively(self):
+        response = await self.async_client.get(reverse('menu-item', args=[self.pasta.pk]), headers=self.headers)
+
+        self.assertEqual(response.json()['price'], '9.50')
+
+    async def test_order_history_is_served_natively(self):
+        response = await self.async_client.get(reverse('orders-management-view'), headers=self.headers)
+
+        self.assertEqual([order['total'] for order in response.json()], ['9.50'])
+
+        with mock.patch('LittleLemonAPI.async_views.STREAM_MIN_ROWS', 1):
+            streamed = await self.async_client.get(reverse('orders-management-view'), headers=self.headers)
+        self.assertEqual(b''.join([chunk async for chunk in streamed.streaming_content]), response.content)
+
+    async def test_other_requests_are_handed_to_the_drf_views(self):
+        response = await self.async_client.get(reverse('orders-management-view'))
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.post(reverse('menu-items'), {'title': 'Soup'}, headers=self.headers)
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,210 @@
+import math
+import threading
+import time
+from functools import lru_cache
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .roles import MANAGER, DELIVERY_CREW
+
+ANONYMOUS = 'anon'
+CUSTOMER = 'customer'
+# Rates of the roles for the endpoints without rates of their own.
+DEFAULT_SCOPE = '*'
+
+_periods = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+@lru_cache(maxsize=None)
+def throttled_views():
+    """
+        Returns the views of LittleLemonAPI/urls.py, the only ones throttled. Admin and djoser routes are not,
+        whatever their URL names.
+    """
+    return frozenset(pattern.callback for pattern in import_module('LittleLemonAPI.urls').urlpatterns)
+
+
+def parse_rate(rate):
+    """
+        Returns (requests, seconds) of a rate like '100/min', None for no rate.
+    """
+    if rate is None:
+        return None
+    requests, period = rate.split('/')
+    return int(requests), _periods[period[0]]
+
+
+def client_address(request):
+    """
+        Returns the address anonymous clients are counted by.
+
+        * Behind settings.THROTTLE_NUM_PROXIES reverse proxies it is the address the outermost of them
+          appended to X-Forwarded-For, addresses further left are set by the client and not trusted.
+          Without proxies, or without the header, it is REMOTE_ADDR.
+    """
+    num_proxies = getattr(settings, 'THROTTLE_NUM_PROXIES', 0)
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if num_proxies and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(',')]
+        return addresses[-min(num_proxies, len(addresses))]
+    return request.META.get('REMOTE_ADDR')
+
+
+def throttle_role(user, roles):
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+    if MANAGER in roles:
+        return MANAGER
+    if DELIVERY_CREW in roles:
+        return DELIVERY_CREW
+    return CUSTOMER
+
+
+def get_rate(url_name, role):
+    """
+        Returns the scope and the (requests, seconds) rate of the role on the endpoint, None when it is not throttled.
+
+        * settings.THROTTLE_RATES maps URL names, or DEFAULT_SCOPE, to the rate per role. An endpoint with
+          its own rate for the role has a counter of its own, the others share the DEFAULT_SCOPE counter.
+    """
+    rates = getattr(settings, 'THROTTLE_RATES', {})
+    endpoint_rates = rates.get(url_name, {})
+    if role in endpoint_rates:
+        return url_name, parse_rate(endpoint_rates[role])
+    return DEFAULT_SCOPE, parse_rate(rates.get(DEFAULT_SCOPE, {}).get(role))
+
+
+def sliding_window_wait(previous, current, limit, window, now):
+    """
+        Returns the seconds to wait before the next request, 0 when it may pass.
+
+        * The count of the sliding window is estimated from the counts of the current and the previous
+          fixed windows, the previous one weighted by the part of it the sliding window still covers.
+    """
+    elapsed = now % window
+    if previous * (1 - elapsed / window) + current < limit:
+        return 0
+    if current >= limit or not previous:
+        return window - elapsed
+    # Until the weight of the previous window falls below what the current one leaves of the limit,
+    # never 0 for a request over the limit.
+    return max((1 - (limit - current) / previous) * window - elapsed, 0.001)
+
+
+class CacheThrottleStore:
+    """
+        Sliding window counters kept in the default cache.
+
+        * The counters are shared by the processes only when the default cache is, see CACHE_LOCATION in
+          settings.py. With a local memory cache each process counts alone and the limit is multiplied
+          by the number of processes.
+        * A check reads two counters and increments one, whatever the number of requests in the window.
+        * Concurrent requests may both pass the last free slot, the limit is not a strict one.
+    """
+
+    def keys(self, key, window, now):
+        number = int(now // window)
+        # Role names hold spaces, which memcached does not take in keys.
+        key = key.replace(' ', '_')
+        return f'throttle:{key}:{number - 1}', f'throttle:{key}:{number}'
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        previous_key, current_key = self.keys(key, window, now)
+
+        counts = cache.get_many([previous_key, current_key])
+        wait = sliding_window_wait(counts.get(previous_key, 0), counts.get(current_key, 0), limit, window, now)
+        if wait:
+            return wait
+
+        if not cache.add(current_key, 1, window * 2):
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                cache.set(current_key, 1, window * 2)
+        return 0
+
+    async def ahit(self, key, limit, window):
+        now = time.time()
+        previous_key, current_key = self.keys(key, window, now)
+
+        counts = await cache.aget_many([previous_key, current_key])
+        wait = sliding_window_wait(counts.get(previous_key, 0), counts.get(current_key, 0), limit, window, now)
+        if wait:
+            return wait
+
+        if not await cache.aadd(current_key, 1, window * 2):
+            try:
+                await cache.aincr(current_key)
+            except ValueError:
+                await cache.aset(current_key, 1, window * 2)
+        return 0
+
+
+class InMemoryThrottleStore:
+    """
+        Sliding window counters of one process for tests, entries are never evicted.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = {}
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        number = int(now // window)
+        with self.lock:
+            start, previous, current = self.windows.get(key, (number, 0, 0))
+            if start != number:
+                previous, current = current if start == number - 1 else 0, 0
+
+            wait = sliding_window_wait(previous, current, limit, window, now)
+            self.windows[key] = (number, previous, current if wait else current + 1)
+        return wait
+
+    async def ahit(self, key, limit, window):
+        return self.hit(key, limit, window)
+
+    def clear(self):
+        with self.lock:
+            self.windows.clear()
+
+
+@lru_cache(maxsize=None)
+def _store(path):
+    return import_string(path)()
+
+
+def get_throttle_store():
+    return _store(settings.THROTTLE_STORE)
+
+
+def throttle_wait(url_name, user, roles, address):
+    """
+        Counts a request against the rate of the role of the user on the endpoint,
+        returns the whole seconds to wait when it is over the rate, None otherwise.
+
+        * Users are counted by id, anonymous clients by address.
+    """
+    role = throttle_role(user, roles)
+    scope, rate = get_rate(url_name, role)
+    if rate is None:
+        return None
+
+    identity = user.pk if role != ANONYMOUS else address
+    wait = get_throttle_store().hit(f'{scope}:{role}:{identity}', *rate)
+    return max(1, math.ceil(wait)) if wait else None
+
+
+async def athrottle_wait(url_name, user, roles, address):
+    role = throttle_role(user, roles)
+    scope, rate = get_rate(url_name, role)
+    if rate is None:
+        return None
+
+    identity = user.pk if role != ANONYMOUS else address
+    wait = await get_throttle_store().ahit(f'{scope}:{role}:{identity}', *rate)
+    return max(1, math.ceil(wait)) if wait else None
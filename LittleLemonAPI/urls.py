@@ -1,15 +1,26 @@
 from django.urls import path 
-from . import views 
+from . import views, async_views 
 from rest_framework.authtoken.views import obtain_auth_token
+from .roles import MANAGER, DELIVERY_CREW
   
 urlpatterns = [ 
-    path('menu-items', views.menu_items, name='menu-items'), 
+    path('menu-items', async_views.menu_items, name='menu-items'), 
+    path('menu-items/import', views.menu_import_view, name='menu-import-view'),
     path('api-token-auth/', obtain_auth_token),
-    path('menu-items/<int:menuItem>', views.menu_item, name='menu-item'),
+    path('menu-items/<int:menuItem>', async_views.menu_item, name='menu-item'),
     path('groups/manager/users', views.managers_group_view, name='managers-group'),
+    path('groups/manager/users/bulk', views.group_members_bulk_view, {'group': MANAGER}, name='managers-group-bulk'),
     path('groups/manager/users/<int:userId>', views.manager_view, name='managers-view'),
     path('groups/delivery-crew/users', views.delivery_crew_view, name='delivery-crew-view'),
+    path('groups/delivery-crew/users/bulk', views.group_members_bulk_view, {'group': DELIVERY_CREW},
+         name='delivery-crew-bulk'),
     path('cart/menu-items', views.cart_management_view, name='cart-management-view'),
-    path('orders', views.orders_management_view, name='orders-management-view'),
+    path('cart/summary', views.cart_summary_view, name='cart-summary-view'),
+    path('orders', async_views.orders_management_view, name='orders-management-view'),
+    path('orders/queue', async_views.delivery_queue_view, name='delivery-queue-view'),
+    path('orders/events', async_views.order_events_view, name='order-events-view'),
+    path('orders/export', views.orders_export_view, name='orders-export-view'),
     path('orders/<int:orderId>', views.order_view, name='order-view'),
+    path('reports/sales', views.sales_report_view, name='sales-report-view'),
+    path('metrics', views.metrics_view, name='metrics'),
 ] 
\ No newline at end of file
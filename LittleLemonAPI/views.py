@@ -1,33 +1,53 @@
 from django.shortcuts import render, get_object_or_404
-from .models import MenuItem, Category, Cart, Order, OrderItem
-from .serializers import MenuItemSerializer, UserSerializer, CartSerializer, OrderItemSerializer, OrderSerializer
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from .models import MenuItem, Category, Cart, Order, ArchivedOrder
+from .serializers import MenuItemSerializer, UserSerializer, CartSerializer, CartLineSerializer, CartSummarySerializer, OrderSerializer, OrderFeedSerializer, OrderExportFilterSerializer, SalesReportFilterSerializer, SalesReportSerializer, DeliveryQueueSerializer, MenuImportOptionsSerializer, BulkMembershipSerializer
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import status
 from django.contrib.auth.models import Group, User
+from django.db import transaction
+from .cart import update_cart, clear_cart, cart_summary, delete_menu_item
+from .catalogue import CATALOGUE_FORMATS, catalogue_response, build_menu_page, bump_catalogue_version
+from .menu_import import import_menu
+from .metrics import render_prometheus
+from .parsers import CSVParser
+from .renderers import list_response, streaming_content
+from .delivery import claim_next_order
+from .events import order_changed
+from .exports import ndjson_export, csv_export, filter_export
+from .idempotency import idempotent
+from .orders import order_feed_data, order_items_data, place_order
+from .routers import reads_from_replica
+from .sales import move_order_sales, sales_report
+from .roles import MANAGER, DELIVERY_CREW, is_manager, is_delivery_crew, is_customer, invalidate_roles, change_memberships
 
 # Create your views here.
 
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@reads_from_replica
 def menu_items(request):
     """
     View list of menu items in the system.
 
+    * [GET] Returns a page of menu items, filtered by ?category=, ?featured=, ?min_price= and ?max_price=,
+      ordered by ?ordering= (title, price or id) and paginated with the ?cursor= of the previous page.
     * Only Manager user can create new menu items.
     """
 
     if request.method == 'GET':
-        items = MenuItem.objects.all()
-        serialized_item = MenuItemSerializer(items, many=True)
+        if request.accepted_renderer.format in CATALOGUE_FORMATS:
+            return catalogue_response(request, request.accepted_renderer.format)
 
-        return Response(serialized_item.data, status.HTTP_200_OK)
+        return Response(build_menu_page(request), status.HTTP_200_OK)
 
     elif request.method == 'POST':
-        if request.user.groups.filter(name="Manager").exists():
+        if is_manager(request.user):
             title = request.POST.get('title')
             price = request.POST.get('price')
             featured = request.POST.get('featured')
@@ -42,6 +62,7 @@ def menu_items(request):
             )
             try:
                 menu_item.save()
+                bump_catalogue_version()
                 return Response(status.HTTP_201_CREATED)
             except Exception as e:
                 return Response({"error": e}, status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -52,6 +73,7 @@ def menu_items(request):
 
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@reads_from_replica
 def menu_item(request, menuItem):
 
     try:
@@ -65,30 +87,62 @@ def menu_item(request, menuItem):
         return Response(serialized_item.data, status.HTTP_200_OK)
 
     if request.method == 'PUT':
-        if request.user.groups.filter(name="Manager").exists():
+        if is_manager(request.user):
             serializer = MenuItemSerializer(item, data=request.data)
             if serializer.is_valid():
                 serializer.save()
+                bump_catalogue_version()
                 return Response(status.HTTP_200_OK)
 
         return Response({"message": "this operation is permited!"}, status.HTTP_403_FORBIDDEN)
 
     if request.method == 'PATCH':
-        if request.user.groups.filter(name="Manager").exists():
+        if is_manager(request.user):
             serializer = MenuItemSerializer(item, data=request.data)
             if serializer.is_valid():
                 serializer.save()
+                bump_catalogue_version()
                 return Response(status.HTTP_200_OK)
 
         return Response({"message": "this operation is permited!"}, status.HTTP_403_FORBIDDEN)
 
     if request.method == 'DELETE':
-        if request.user.groups.filter(name="Manager").exists():
-            item.delete()
-            return Response(serialized_item.data, status.HTTP_200_OK)
+        if is_manager(request.user):
+            deleted_item = MenuItemSerializer(item, many=False).data
+            delete_menu_item(item)
+            bump_catalogue_version()
+            return Response(deleted_item, status.HTTP_200_OK)
+
+        return Response({"message": "this operation is permited!"}, status.HTTP_403_FORBIDDEN)
+
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, CSVParser])
+def menu_import_view(request):
+    """
+        Bulk import of menu items, only for Managers
+
+        * [POST] Creates or updates the menu items of a JSON list (or {"items": [...]}) or of a text/csv body
+          with title, price, featured, category (id or slug) and optionally id columns.
+          Returns a report per row, nothing is written when a row is invalid unless ?partial=true is given.
+          ?dry_run=true only validates.
+    """
+    if not is_manager(request.user):
         return Response({"message": "this operation is permited!"}, status.HTTP_403_FORBIDDEN)
 
+    rows = request.data.get('items') if isinstance(request.data, dict) else request.data
+    if not isinstance(rows, list):
+        return Response({'items': ['Expected a list of menu items.']}, status.HTTP_400_BAD_REQUEST)
+
+    options = MenuImportOptionsSerializer(data=request.query_params.dict())
+    options.is_valid(raise_exception=True)
+    report = import_menu(rows, **options.validated_data)
+    if report['invalid'] and not options.validated_data['partial']:
+        return Response(report, status.HTTP_400_BAD_REQUEST)
+
+    return Response(report, status.HTTP_200_OK)
+
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
@@ -99,9 +153,9 @@ def managers_group_view(request):
     * [GET] Only Manager user can get a list of Managers in system.
     * [POST] Only Manager could assign via POST method new Manager to system from payload aka body
     """
-    if request.user.groups.filter(name="Manager").exists():
+    if is_manager(request.user):
         if request.method == 'GET':
-            managers = User.objects.filter(groups__name='Manager')
+            managers = User.objects.filter(groups__name=MANAGER)
             serialized_item = UserSerializer(managers, many=True)
 
             return Response(serialized_item.data, status.HTTP_200_OK)
@@ -111,8 +165,9 @@ def managers_group_view(request):
 
             if username:
                 user = get_object_or_404(User, username=username)
-                managers = Group.objects.get(name='Manager')
+                managers = Group.objects.get(name=MANAGER)
                 managers.user_set.add(user)
+                invalidate_roles(user.id)
                 return Response(status.HTTP_201_CREATED)
 
     else:
@@ -127,11 +182,12 @@ def manager_view(request, userId):
 
     * [DELETE] Removes this particular user from the manager group
     """
-    if request.user.groups.filter(name="Manager").exists():
+    if is_manager(request.user):
         user = get_object_or_404(User, id=userId)
         if request.method == 'DELETE':
-            managers = Group.objects.get(name='Manager')
+            managers = Group.objects.get(name=MANAGER)
             managers.user_set.remove(user)
+            invalidate_roles(user.id)
 
             return Response(status.HTTP_200_OK)
 
@@ -148,9 +204,9 @@ def delivery_crew_view(request):
     * [GET] Get list of all users with role delivery crew.
     * [POST] Assign user to delivery crew
     """
-    if request.user.groups.filter(name='Manager').exists():
+    if is_manager(request.user):
         if request.method == 'GET':
-            deliver_crews = User.objects.filter(groups__name='Delivery crew')
+            deliver_crews = User.objects.filter(groups__name=DELIVERY_CREW)
             serialized_item = UserSerializer(deliver_crews, many=True)
 
             return Response(serialized_item.data, status.HTTP_200_OK)
@@ -160,9 +216,9 @@ def delivery_crew_view(request):
 
             if username:
                 user = get_object_or_404(User, username=username)
-                # TODO: make group names as constants
-                delivery_crews = Group.objects.get(name='Delivery crew')
+                delivery_crews = Group.objects.get(name=DELIVERY_CREW)
                 delivery_crews.user_set.add(user)
+                invalidate_roles(user.id)
                 return Response(status.HTTP_201_CREATED)
             else:
                 return Response({'message': 'no user name was provided in payload!'}, status.HTTP_400_BAD_REQUEST)
@@ -170,98 +226,174 @@ def delivery_crew_view(request):
         return Response({'message': 'this operation is permited!'}, status.HTTP_403_FORBIDDEN)
 
 
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def group_members_bulk_view(request, group):
+    """
+    View for user with Manager role to assign or remove many users of the group at once.
+
+    * [POST] Adds the users of the usernames list in the payload to the group
+    * [DELETE] Removes the users of the usernames list in the payload from the group
+    * Answers with the status of every username: added, already a member, removed, not a member or not found
+    """
+    if not is_manager(request.user):
+        return Response({'message': 'this operation is permited!'}, status.HTTP_403_FORBIDDEN)
+
+    serializer = BulkMembershipSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    results = change_memberships(group, serializer.validated_data['usernames'], add=request.method == 'POST')
+
+    return Response({'results': results}, status.HTTP_200_OK)
+
+
 @api_view(['GET', 'POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def cart_management_view(request):
     """
         Cart managment view for Customers and authenticated users
 
         * [GET] Returns current items in the cart for the current user 
-        * [POST] Adds the menu item to the cart.
+        * [POST] Adds menu items to the cart or changes their quantity, either one item from
+          menuitem and quantity or a batch from a list of {menuitem, quantity} (bare or under items)
         * [DELETE] Deletes all menu items created by the current user token
     """
     if request.method == 'GET':
-        menu_items = Cart.objects.get(user__username=request.user).menuitem
-        serialized_item = MenuItemSerializer(menu_items, many=False)
+        cart = Cart.objects.filter(user=request.user).order_by('id')
+        serialized_items = CartSerializer(cart, many=True)
 
-        return Response(serialized_item.data, status.HTTP_200_OK)
+        return Response(serialized_items.data, status.HTTP_200_OK)
 
     if request.method == 'POST':
-        menuitem_id = request.POST.get('menuitem_id')
-        quantity = request.POST.get('quantity')
-        unit_price = request.POST.get('unit_price')
-        price = request.POST.get('price')
-
-        users_cart = Cart.objects.get(user__username=request.user)
-        menuitem = get_object_or_404(MenuItem, pk=menuitem_id)
+        if isinstance(request.data, list):
+            payload = request.data
+        elif 'items' in request.data:
+            payload = request.data['items']
+        else:
+            payload = [{
+                'menuitem': request.data.get('menuitem', request.data.get('menuitem_id')),
+                'quantity': request.data.get('quantity'),
+            }]
 
-        users_cart.menuitem = menuitem
-        users_cart.quantity = quantity
-        users_cart.unit_price = unit_price
-        users_cart.price = price
+        serialized_lines = CartLineSerializer(data=payload, many=True)
+        serialized_lines.is_valid(raise_exception=True)
+        update_cart(request.user, [(line['menuitem'], line['quantity']) for line in serialized_lines.validated_data])
 
-        users_cart.save()
+        cart = Cart.objects.filter(user=request.user).order_by('id')
+        serialized_items = CartSerializer(cart, many=True)
 
-        return Response(status.HTTP_201_CREATED)
+        return Response(serialized_items.data, status.HTTP_201_CREATED)
 
     if request.method == 'DELETE':
-
-        user_cart = Cart.objects.get(user__username=request.user)
-        user_cart.menuitem = None
+        clear_cart(request.user)
 
         return Response(status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cart_summary_view(request):
+    """
+        Summary of the cart of the current user
+
+        * [GET] Returns the number of items, the subtotal and the time the cart was last changed
+    """
+    serialized_summary = CartSummarySerializer(cart_summary(request.user))
+
+    return Response(serialized_summary.data, status.HTTP_200_OK)
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@reads_from_replica
+@idempotent
 def orders_management_view(request):
+    """
+        Orders view for Customers, Delivery crew and Managers
+
+        * [GET] Returns the orders visible to the current user, each with its items
+        * [POST] Places an order from the items in the cart of the current user and empties the cart
+    """
     if request.method == 'GET':
-        if request.user.groups.filter(name='Delivery crew').exists():
-            orders_of_the_crew = Order.objects.filter(
-                delivery_crew__id=request.user.id).values_list('id', flat=True)
-            order_items = OrderItem.objects.filter(
-                order__id__in=list(orders_of_the_crew))
-            serialized_items = OrderItemSerializer(order_items, many=True)
+        return list_response(request, order_feed_data(request.user))
 
-            return Response(serialized_items.data, status.HTTP_200_OK)
+    if request.method == 'POST':
+        if is_customer(request.user):
+            new_order = place_order(request.user)
+            if new_order is None:
+                return Response({'message': 'the cart is empty!'}, status.HTTP_400_BAD_REQUEST)
 
-        if request.user.groups.filter(name='Manager').exists():
-            order_items = OrderItem.objects.all()
-            serialized_items = OrderItemSerializer(order_items, many=True)
+            return Response(OrderFeedSerializer(new_order).data, status.HTTP_201_CREATED)
+        else:
+            return Response({'message': 'this operation is permited!'}, status.HTTP_403_FORBIDDEN)
 
-            return Response(serialized_items.data, status.HTTP_200_OK)
 
-        orders_of_user_ids = Order.objects.filter(
-            user__id=request.user.id).values_list('id', flat=True)
-        order_items = OrderItem.objects.filter(
-            order__id__in=list(orders_of_user_ids))
-        serialized_items = OrderItemSerializer(order_items, many=True)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def delivery_queue_view(request):
+    """
+        Work queue of the Delivery crew
 
-        return Response(serialized_items.data, status.HTTP_200_OK)
+        * [POST] Assigns the oldest undelivered order without delivery crew to the current user and returns it,
+          waiting up to ?wait= seconds for one when the queue is empty. Returns 204 when none came in
+        * Only JSON token requests served through LittleLemon.asgi wait, by the async view. This view answers at once
+    """
+    if not is_delivery_crew(request.user):
+        return Response({'message': 'this operation is permited!'}, status.HTTP_403_FORBIDDEN)
 
-    if request.method == 'POST':
-        if request.user.groups.filter(name='Delivery crew').filter(name='Manager').exclude():
-            delivery_crew_id = request.POST.get('delivery_crew')
-            delivery_crew = get_object_or_404(User, pk=delivery_crew_id)
+    params = DeliveryQueueSerializer(data=request.query_params.dict())
+    params.is_valid(raise_exception=True)
+    order = claim_next_order(request.user)
+    if order is None:
+        return Response(None, status.HTTP_204_NO_CONTENT)
+
+    return Response(OrderFeedSerializer(order).data, status.HTTP_200_OK)
 
-            status_of_delivery = request.POST.get('status')
-            total = request.POST.get('total')
-            date = request.POST.get('date')
 
-            new_order = Order(request.user, delivery_crew,
-                              bool(status_of_delivery), total, date)
-            new_order.save()
-            cart_of_user = Cart.objects.get(user__username=request.user)
-            new_order_item = OrderItem(
-                new_order, order_items.menuitem, order_items.quantity, order_items.unit_price, order_items.price)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def orders_export_view(request):
+    """
+        Export of every order with its items, only for Managers
 
-            new_order_item.save()
+        * [GET] Streams the orders of ?start_date= to ?end_date= (inclusive) as NDJSON, or as CSV with ?type=csv,
+          archived orders included
+    """
+    if not is_manager(request.user):
+        return Response({'message': 'this operation is permited!'}, status.HTTP_403_FORBIDDEN)
 
-            cart_of_user.menuitem = None
+    params = OrderExportFilterSerializer(data=request.query_params.dict())
+    params.is_valid(raise_exception=True)
+    orders = filter_export(Order.objects.all(), params.validated_data)
+    archived = filter_export(ArchivedOrder.objects.all(), params.validated_data)
 
-            return Response(status.HTTP_201_CREATED)
-        else:
-            return Response(status.HTTP_405_METHOD_NOT_ALLOWED)
+    if params.validated_data['type'] == 'csv':
+        chunks, content_type = csv_export(orders, archived), 'text/csv; charset=utf-8'
+    else:
+        chunks, content_type = ndjson_export(orders, archived), 'application/x-ndjson'
+    response = StreamingHttpResponse(streaming_content(request, chunks, blocking=True), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="orders.{params.validated_data["type"]}"'
+
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sales_report_view(request):
+    """
+        Sales report from the daily rollups, only for Managers
+
+        * [GET] Returns units and revenue from ?start_date= to ?end_date= (inclusive) per menu item,
+          or per category with ?group=category, and per day as well with ?per_day=true
+    """
+    if not is_manager(request.user):
+        return Response({'message': 'this operation is permited!'}, status.HTTP_403_FORBIDDEN)
+
+    params = SalesReportFilterSerializer(data=request.query_params.dict())
+    params.is_valid(raise_exception=True)
+    serialized_report = SalesReportSerializer(sales_report(params.validated_data), many=True)
+
+    return Response(serialized_report.data, status.HTTP_200_OK)
 
 
 @api_view(['GET', 'DELETE', 'PATCH', 'PUT'])
@@ -269,37 +401,43 @@ def orders_management_view(request):
 def order_view(request, orderId):
     """
         View of managment of specific order
+
+        * [GET] Returns the items of the order with the prices they were ordered at, archived orders included
     """
     if request.method == 'GET':
-        if request.user.groups.filter(name='Manager').filter(name='Delivery crew').exclude():
-            order = get_object_or_404(Order, pk=orderId)
-            order_items = OrderItem.objects.filter(order__id=order.id)
-            menu_items_ids = [
-                order_item.menuitem.id for order_item in order_items]
+        if is_manager(request.user) or is_delivery_crew(request.user):
+            # Archived orders can be read but no longer changed.
+            items = order_items_data(orderId)
+            if items is None:
+                raise Http404
 
-            menu_items = MenuItem.objects.filter(pk__in=list(menu_items_ids))
-            serialized_item = MenuItemSerializer(menu_items, many=True)
-
-            return Response(serialized_item.data, status.HTTP_200_OK)
+            return Response(items, status.HTTP_200_OK)
 
     if request.method == 'DELETE':
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             order = Order.objects.get(pk=orderId)
             order.delete()
+
+            return Response(status.HTTP_200_OK)
         else:
             return Response(status.HTTP_403_FORBIDDEN)
 
     if request.method == 'PUT':
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             order = get_object_or_404(Order, pk=orderId)
+            old_date, old_delivery_crew_id = order.date, order.delivery_crew_id
             serializer = OrderSerializer(order, data=request.data)
             if serializer.is_valid():
-                serializer.save()
+                with transaction.atomic():
+                    serializer.save()
+                    move_order_sales(order, old_date)
+                    order_changed(order, old_delivery_crew_id)
                 return Response(status.HTTP_200_OK)
 
     if request.method == 'PATCH':
-        if request.user.groups.filter(name='Manager').exists():
+        if is_manager(request.user):
             order = get_object_or_404(Order, pk=orderId)
+            old_delivery_crew_id = order.delivery_crew_id
 
             order_status = request.data['status']
             delivery_crew_id = request.data['deliver_crew_id']
@@ -307,14 +445,25 @@ def order_view(request, orderId):
             order.status = order_status
             order.delivery_crew = User.objects.get(pk=delivery_crew_id)
             order.save()
+            order_changed(order, old_delivery_crew_id)
 
             return Response(status.HTTP_200_OK)
 
-        if request.user.groups.filter(name='Delivery crew').exists():
+        if is_delivery_crew(request.user):
             order = Order.objects.get(pk=orderId)
 
             status_of_delivery = request.POST.get('status')
             order.status = status_of_delivery
 
             order.save()
+            order_changed(order)
             return Response(status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """
+        Request metrics per URL name in the Prometheus text format, only for admin users.
+    """
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def snapshot_prices(apps, schema_editor):
+    # Existing items take the current price of their menu item, the closest record left of the checkout price.
+    OrderItem = apps.get_model('LittleLemonAPI', 'OrderItem')
+    MenuItem = apps.get_model('LittleLemonAPI', 'MenuItem')
+    OrderItem.objects.update(unit_price=Subquery(MenuItem.objects.filter(pk=OuterRef('menuitem_id')).values('price')[:1]))
+    OrderItem.objects.update(price=F('unit_price') * F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0003_remove_orderitem_price_remove_orderitem_unit_price_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+            preserve_default=False,
+        ),
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+    ]
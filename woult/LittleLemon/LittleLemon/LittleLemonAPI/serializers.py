@@ -52,16 +52,10 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['id','user','total','status','delivery_crew','date']
 
-class OrderMenuItemSerializer(serializers.ModelSerializer):
-    class Meta():
-        model = MenuItem
-        fields = ['title','price']
-
 class SingleOrderSerializer(serializers.ModelSerializer):
-    menuitem = OrderMenuItemSerializer()
     class Meta():
         model = OrderItem
-        fields = ['menuitem','quantity']
+        fields = ['menuitem','quantity','unit_price','price']
 
 class OrderPutSerializer(serializers.ModelSerializer):
     class Meta():
@@ -1,5 +1,6 @@
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User, Group
+from django.db import transaction
 
 from rest_framework import status, generics
 from rest_framework.response import Response
@@ -9,7 +10,6 @@ from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
 from .models import Category, MenuItem, Cart, Order, OrderItem
 from .serializers import MenuItemSerializer, CategorySerializer, ManagerSerializer, DeliveryCrewSerializer, CartSerializer, CartAddSerializer, OrderSerializer, SingleOrderSerializer, OrderPutSerializer
 
-import math
 from datetime import date
 
 
@@ -172,17 +172,19 @@ class OrderView(generics.ListCreateAPIView):
         return[permission() for permission in permission_classes]
 
     def post(self, request, *args, **kwargs):
-        cart = Cart.objects.filter(user=request.user)
-        x=cart.values_list()
-        if len(x) == 0:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        total = math.fsum([float(x[-1]) for x in x])
-        order = Order.objects.create(user=request.user, status=False, total=total, date=date.today())
-        for i in cart.values():
-            menuitem = get_object_or_404(MenuItem, id=i['menuitem_id'])
-            orderitem = OrderItem.objects.create(order=order, menuitem=menuitem, quantity=i['quantity'])
-            orderitem.save()
-        cart.delete()
+        with transaction.atomic():
+            cart = Cart.objects.filter(user=request.user)
+            # The prices the cart showed are kept in the order items, later price changes leave the order as it is.
+            lines = list(cart.select_for_update().values_list('menuitem_id', 'quantity', 'unit_price', 'price'))
+            if len(lines) == 0:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            total = sum(price for *_, price in lines)
+            order = Order.objects.create(user=request.user, status=False, total=total, date=date.today())
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menuitem_id=menuitem_id, quantity=quantity, unit_price=unit_price, price=price)
+                for menuitem_id, quantity, unit_price, price in lines
+            ])
+            cart.delete()
         return Response({'message':'Order #{} created'.format(str(order.id))}, status.HTTP_201_CREATED)
 
 